@@ -1,9 +1,38 @@
 import os
-import traceback
+import sys
+import linecache
 from pathlib import Path
+from functools import lru_cache
+
+_QM_PACKAGE_DIR = Path(os.path.abspath(__file__)).parent
+
+
+@lru_cache(maxsize=None)
+def _is_package_file(filename: str) -> bool:
+    return _QM_PACKAGE_DIR in Path(filename).parents
+
+
+@lru_cache(maxsize=4096)
+def _format_loc(filename: str, lineno: int, mtime: float) -> str:
+    # the modification time is only part of the key, so that an edited file is read again, as extract_stack() did
+    linecache.checkcache(filename)
+    line = linecache.getline(filename, lineno).strip() if lineno is not None else None
+    return f'File "{filename}", line {lineno}: {line} '
+
+
+def _get_mtime(filename: str) -> float:
+    try:
+        return os.stat(filename).st_mtime
+    except OSError:
+        # not a real file (e.g. a notebook cell or the interactive prompt), linecache holds its source
+        return 0.0
 
 
 def _get_loc() -> str:
-    qm_package_dir = Path(os.path.abspath(__file__)).parent
-    trace = [i for i in traceback.extract_stack() if qm_package_dir not in Path(i.filename).parents][-1]
-    return f'File "{trace.filename}", line {trace.lineno}: {trace.line} '
+    # Walks out from the caller to the innermost frame outside the qm package, instead of extracting (and reading the
+    # source lines of) the whole stack. The formatted location is shared by every call made from the same line.
+    frame = sys._getframe(1)
+    while _is_package_file(frame.f_code.co_filename):
+        frame = frame.f_back
+    filename = frame.f_code.co_filename
+    return _format_loc(filename, frame.f_lineno, _get_mtime(filename))
@@ -97,14 +97,14 @@ def _redirect(connection_details: ConnectionDetails) -> ConnectionDetails:
 def _connect(
     connection_details: ConnectionDetails,
 ) -> Tuple[Optional[QuaMachineInfo], Optional[str]]:
-    frontend = FrontendApi(connection_details)
     info_service = InfoServiceApi(connection_details)
 
     info = info_service.get_info()
     if info.implementation.version:
         server_version = info.implementation.version
     else:
-        server_version = frontend.get_version()
+        # only older servers do not report their version in the info, so the frontend channel is opened just for them
+        server_version = FrontendApi(connection_details).get_version()
 
     logger.debug(f"Established connection to {connection_details.host}:{connection_details.port}")
 
@@ -1,4 +1,4 @@
-from typing import TYPE_CHECKING, List, Tuple, Union, Optional
+from typing import TYPE_CHECKING, Tuple, Union, Optional, Sequence
 
 import betterproto
 from betterproto.lib.google.protobuf import Empty
@@ -22,6 +22,7 @@ if TYPE_CHECKING:
 class StatementsCollection:
     def __init__(self, body: _qua.QuaProgramStatementsCollection):
         self._body = body
+        self._folded_if_end: Optional[int] = None
 
     @staticmethod
     def _check_serialised_on_wire(message: _qua.QuaProgramAnyStatement, name: str):
@@ -291,7 +292,7 @@ class StatementsCollection:
         if pulse_to_play is not None:
             statement.wait_for_trigger.pulse_to_play.name = pulse_to_play
         if trigger_element is not None:
-            if type(trigger_element) == tuple:
+            if type(trigger_element) is tuple:
                 el, out = trigger_element
                 statement.wait_for_trigger.element_output = _qua.QuaProgramWaitForTriggerStatementElementOutput(
                     element=el, output=out
@@ -431,7 +432,7 @@ class StatementsCollection:
         self._body.statements.append(statement)
         return StatementsCollection(statement.if_.body)
 
-    def for_each(self, iterators: List[Tuple["MessageVariableType", ...]]) -> "StatementsCollection":
+    def for_each(self, iterators: Sequence[Tuple["MessageVariableType", ...]]) -> "StatementsCollection":
         statement = _qua.QuaProgramAnyStatement(
             for_each=_qua.QuaProgramForEachStatement(
                 loc=_get_loc(),
@@ -446,6 +447,13 @@ class StatementsCollection:
         self._body.statements.append(statement)
         return StatementsCollection(statement.for_each.body)
 
+    def mark_folded_if(self) -> None:
+        """Records that the statements added so far end with an ``if`` that was folded when the program was built"""
+        self._folded_if_end = len(self._body.statements)
+
+    def ends_with_folded_if(self) -> bool:
+        return self._folded_if_end == len(self._body.statements)
+
     def get_last_statement(self):
         statements = self._body.statements
         length_statements = len(statements)
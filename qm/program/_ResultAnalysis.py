@@ -1,4 +1,4 @@
-from typing import List, Union
+from typing import Any, Set, List, Tuple, Union, Iterable
 
 from betterproto.lib.google.protobuf import Value, ListValue
 
@@ -12,6 +12,7 @@ class _ResultAnalysis:
         super().__init__()
         self._result_analysis = result_analysis
         self._saves = []
+        self._tags: Set[str] = set()
 
     def get_outputs(self):
         names = []
@@ -20,23 +21,24 @@ class _ResultAnalysis:
                 names.append(save.tag)
         return names
 
+    def _add_save(self, tag, expression, operator_array: List[str]):
+        if tag in self._tags:
+            raise Exception("can not save two streams with the same tag")
+        self._tags.add(tag)
+        self._saves.append(_OutputStream(expression, operator_array, tag))
+
     def save(self, tag, expression):
-        for save in self._saves:
-            if save.tag == tag:
-                raise Exception("can not save two streams with the same tag")
-        self._saves.append(_OutputStream(expression, ["save", tag], tag))
+        self._add_save(tag, expression, ["save", tag])
 
     def save_all(self, tag, expression):
-        for save in self._saves:
-            if save.tag == tag:
-                raise Exception("can not save two streams with the same tag")
-        self._saves.append(_OutputStream(expression, ["saveAll", tag], tag))
+        self._add_save(tag, expression, ["saveAll", tag])
 
     def auto_save_all(self, tag, expression):
-        for save in self._saves:
-            if save.tag == tag:
-                raise Exception("can not save two streams with the same tag")
-        self._saves.append(_OutputStream(expression, ["saveAll", tag, "auto"], tag))
+        self._add_save(tag, expression, ["saveAll", tag, "auto"])
+
+    def auto_save_all_many(self, tags_and_expressions: Iterable[Tuple[str, Any]]):
+        for tag, expression in tags_and_expressions:
+            self._add_save(tag, expression, ["saveAll", tag, "auto"])
 
     def _to_list_value(self, from_list: List[Union[str, List[str]]]) -> ListValue:
         res = ListValue()
@@ -1,4 +1,5 @@
 import logging
+from functools import lru_cache
 from typing import Any, Dict, List, Mapping
 
 import betterproto
@@ -149,8 +150,15 @@ def validate_config_capabilities(pb_config, server_capabilities: ServerCapabilit
                 )
 
 
+@lru_cache(maxsize=None)
+def _get_qua_config_schema() -> "QuaConfigSchema":
+    # Schemas keep no state between loads, and building one (with all the nested schemas it builds on first use) costs
+    # more than most validations, so a single instance is shared by all the calls
+    return QuaConfigSchema()
+
+
 def load_config(config: DictQuaConfig) -> QuaConfig:
-    return QuaConfigSchema().load(config)
+    return _get_qua_config_schema().load(config)
 
 
 PortReferenceSchema = fields.Tuple(
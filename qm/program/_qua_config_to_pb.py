@@ -34,8 +34,9 @@ def analog_input_port_to_pb(data: Dict[str, Any]) -> cfg.QuaConfigAnalogInputPor
     analog_input = cfg.QuaConfigAnalogInputPortDec(
         offset=data.get("offset", 0.0),
         shareable=bool(data.get("shareable")),
-        gain_db=int(data.get("gain_db", 0)),
     )
+    if "gain_db" in data:
+        analog_input.gain_db = int(data["gain_db"])
     return analog_input
 
 
@@ -1,4 +1,5 @@
-from typing import Union, Optional
+from functools import lru_cache
+from typing import List, Union, Iterable, Optional
 
 import qm.grpc.qua as _qua
 from qm._loc import _get_loc
@@ -7,6 +8,29 @@ from qm.exceptions import QmQuaException
 _ScalarExpressionType = _qua.QuaProgramAnyScalarExpression
 _VariableRefType = _qua.QuaProgramVarRefExpression
 
+_LITERAL_TYPES = {
+    bool: _qua.QuaProgramType.BOOL,
+    int: _qua.QuaProgramType.INT,
+    float: _qua.QuaProgramType.REAL,
+}
+
+_BINARY_OPERATORS = {
+    "+": _qua.QuaProgramBinaryExpressionBinaryOperator.ADD,
+    "-": _qua.QuaProgramBinaryExpressionBinaryOperator.SUB,
+    ">": _qua.QuaProgramBinaryExpressionBinaryOperator.GT,
+    "<": _qua.QuaProgramBinaryExpressionBinaryOperator.LT,
+    "<=": _qua.QuaProgramBinaryExpressionBinaryOperator.LET,
+    ">=": _qua.QuaProgramBinaryExpressionBinaryOperator.GET,
+    "==": _qua.QuaProgramBinaryExpressionBinaryOperator.EQ,
+    "*": _qua.QuaProgramBinaryExpressionBinaryOperator.MULT,
+    "/": _qua.QuaProgramBinaryExpressionBinaryOperator.DIV,
+    "|": _qua.QuaProgramBinaryExpressionBinaryOperator.OR,
+    "&": _qua.QuaProgramBinaryExpressionBinaryOperator.AND,
+    "^": _qua.QuaProgramBinaryExpressionBinaryOperator.XOR,
+    "<<": _qua.QuaProgramBinaryExpressionBinaryOperator.SHL,
+    ">>": _qua.QuaProgramBinaryExpressionBinaryOperator.SHR,
+}
+
 
 def var(name: str) -> _VariableRefType:
     """A reference to a variable
@@ -32,35 +56,8 @@ def binary(left: _ScalarExpressionType, sop: str, right: _ScalarExpressionType)
     Returns:
 
     """
-    if sop == "+":
-        op = _qua.QuaProgramBinaryExpressionBinaryOperator.ADD
-    elif sop == "-":
-        op = _qua.QuaProgramBinaryExpressionBinaryOperator.SUB
-    elif sop == ">":
-        op = _qua.QuaProgramBinaryExpressionBinaryOperator.GT
-    elif sop == "<":
-        op = _qua.QuaProgramBinaryExpressionBinaryOperator.LT
-    elif sop == "<=":
-        op = _qua.QuaProgramBinaryExpressionBinaryOperator.LET
-    elif sop == ">=":
-        op = _qua.QuaProgramBinaryExpressionBinaryOperator.GET
-    elif sop == "==":
-        op = _qua.QuaProgramBinaryExpressionBinaryOperator.EQ
-    elif sop == "*":
-        op = _qua.QuaProgramBinaryExpressionBinaryOperator.MULT
-    elif sop == "/":
-        op = _qua.QuaProgramBinaryExpressionBinaryOperator.DIV
-    elif sop == "|":
-        op = _qua.QuaProgramBinaryExpressionBinaryOperator.OR
-    elif sop == "&":
-        op = _qua.QuaProgramBinaryExpressionBinaryOperator.AND
-    elif sop == "^":
-        op = _qua.QuaProgramBinaryExpressionBinaryOperator.XOR
-    elif sop == "<<":
-        op = _qua.QuaProgramBinaryExpressionBinaryOperator.SHL
-    elif sop == ">>":
-        op = _qua.QuaProgramBinaryExpressionBinaryOperator.SHR
-    else:
+    op = _BINARY_OPERATORS.get(sop)
+    if op is None:
         raise QmQuaException("Unsupported operator " + sop)
 
     exp = _qua.QuaProgramAnyScalarExpression(
@@ -69,25 +66,44 @@ def binary(left: _ScalarExpressionType, sop: str, right: _ScalarExpressionType)
     return exp
 
 
-def literal_int(value: int) -> _ScalarExpressionType:
-    exp = _qua.QuaProgramAnyScalarExpression(
-        literal=_qua.QuaProgramLiteralExpression(value=str(value), type=_qua.QuaProgramType.INT, loc=_get_loc())
+@lru_cache(maxsize=4096)
+def _literal(value: str, literal_type: _qua.QuaProgramType, loc: str) -> _ScalarExpressionType:
+    # Literals are never mutated once created, so the same value written on the same line (e.g. in a python
+    # loop generating the program) is shared between all the statements using it
+    return _qua.QuaProgramAnyScalarExpression(
+        literal=_qua.QuaProgramLiteralExpression(value=value, type=literal_type, loc=loc)
     )
-    return exp
+
+
+def literal_int(value: int) -> _ScalarExpressionType:
+    return _literal(str(value), _qua.QuaProgramType.INT, _get_loc())
 
 
 def literal_bool(value: bool) -> _ScalarExpressionType:
-    exp = _qua.QuaProgramAnyScalarExpression(
-        literal=_qua.QuaProgramLiteralExpression(value=str(value), type=_qua.QuaProgramType.BOOL, loc=_get_loc())
-    )
-    return exp
+    return _literal(str(value), _qua.QuaProgramType.BOOL, _get_loc())
 
 
 def literal_real(value: float) -> _ScalarExpressionType:
-    exp = _qua.QuaProgramAnyScalarExpression(
-        literal=_qua.QuaProgramLiteralExpression(value=str(value), type=_qua.QuaProgramType.REAL, loc=_get_loc())
-    )
-    return exp
+    return _literal(str(value), _qua.QuaProgramType.REAL, _get_loc())
+
+
+def literal_array(values: Iterable[Union[bool, int, float]]) -> List[_qua.QuaProgramLiteralExpression]:
+    """Literals for the initial values of an array, all sharing a single location
+
+    Args:
+        values: python bool, int or float values
+
+    Returns:
+
+    """
+    loc = _get_loc()
+    literals = []
+    for value in values:
+        literal_type = _LITERAL_TYPES.get(type(value))
+        if literal_type is None:
+            raise QmQuaException(f"Can't handle {value}")
+        literals.append(_qua.QuaProgramLiteralExpression(value=str(value), type=literal_type, loc=loc))
+    return literals
 
 
 def io1() -> _ScalarExpressionType:
@@ -135,18 +151,16 @@ def lib_func(
     func_name: str,
     *args: Union[_ScalarExpressionType, _qua.QuaProgramArrayVarRefExpression],
 ) -> _ScalarExpressionType:
-    exp = _qua.QuaProgramAnyScalarExpression(
+    # the arguments are built up front and handed to the constructor, rather than appended one by one through the
+    # (slow) attribute access of the already built message
+    arguments = [
+        _qua.QuaProgramLibFunctionExpressionArgument(array=arg)
+        if isinstance(arg, _qua.QuaProgramArrayVarRefExpression)
+        else _qua.QuaProgramLibFunctionExpressionArgument(scalar=arg)
+        for arg in args
+    ]
+    return _qua.QuaProgramAnyScalarExpression(
         lib_function=_qua.QuaProgramLibFunctionExpression(
-            loc=_get_loc(), function_name=func_name, library_name=lib_name
+            loc=_get_loc(), function_name=func_name, library_name=lib_name, arguments=arguments
         )
     )
-
-    for arg in args:
-        if isinstance(arg, _qua.QuaProgramArrayVarRefExpression):
-            element = _qua.QuaProgramLibFunctionExpressionArgument(array=arg)
-            exp.lib_function.arguments.append(element)
-        else:
-            element = _qua.QuaProgramLibFunctionExpressionArgument(scalar=arg)
-            exp.lib_function.arguments.append(element)
-
-    return exp
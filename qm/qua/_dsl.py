@@ -1,15 +1,17 @@
+import sys
 import logging
-import dataclasses
+import warnings
 import math as _math
 from enum import Enum
 from enum import Enum as _Enum
+from functools import lru_cache
 from dataclasses import dataclass
 from collections.abc import Iterable
-from typing import Set, Dict, List, Type, Tuple, Union, Optional
+from typing import Any, Set, Dict, List, Type, Tuple, Union, Callable, Optional
 
 import betterproto
 import numpy as np
-from deprecation import deprecated
+from deprecation import DeprecatedWarning
 
 import qm.grpc.qua as _qua
 from qm._loc import _get_loc
@@ -17,11 +19,11 @@ from qm.program import Program
 from qm.exceptions import QmQuaException
 from qm.utils import is_iter as _is_iter
 import qm.program.expressions as _expressions
+from qm.utils import collection_number_types
 from qm.qua import AnalogMeasureProcess, DigitalMeasureProcess
 from qm.program._ResultAnalysis import _RESULT_SYMBOL, _ResultAnalysis
 from qm.serialization.expression_serializing_visitor import ExpressionSerializingVisitor
 from qm.program.StatementsCollection import StatementsCollection as _StatementsCollection
-from qm.utils import collection_has_type_int, collection_has_type_bool, collection_has_type_float
 from qm.qua._type_hinting import (
     ChirpType,
     OneOrMore,
@@ -444,7 +446,7 @@ def measure(
 
     measure_process = []
     for i, output in enumerate(outputs):
-        if type(output) == tuple:
+        if type(output) is tuple:
             if len(output) == 2:
                 measure_process.append(demod.full(output[0], output[1], ""))
             elif len(output) == 3:
@@ -859,7 +861,7 @@ def case_(case_exp: TypeOrExpression[AllPyTypes]) -> "_BodyScope":
             condition=condition,
             body=_qua.QuaProgramStatementsCollection(statements=[]),
         )
-        switch.if_statement.if_.elseifs.append(else_if_statement)
+        switch.elseifs.append(else_if_statement)
         return _BodyScope(_StatementsCollection(else_if_statement.body))
 
 
@@ -903,7 +905,7 @@ def default_() -> "_BaseScope":
     return _BodyScope(_StatementsCollection(else_statement))
 
 
-def if_(expression: QuaExpressionType, **kwargs) -> "_BodyScope":
+def if_(expression: QuaExpressionType, *, fold: bool = False, **kwargs) -> "_BodyScope":
     """If flow control statement in QUA.
 
     To be used with a context manager.
@@ -913,6 +915,11 @@ def if_(expression: QuaExpressionType, **kwargs) -> "_BodyScope":
 
     Args:
         expression: A boolean expression to evaluate
+        fold: If set to True and ``expression`` is a python bool, the condition is resolved when the program is
+            built: the code block is added without a condition if ``expression`` is True, and dropped if it is
+            False. Since no ``if`` statement is generated, a folded ``if_()`` cannot be followed by ``elif_()``
+            or ``else_()`` (doing so raises an exception), and the timing may differ from an evaluated condition.
+            Default is False.
 
     Example:
         ```python
@@ -921,9 +928,13 @@ def if_(expression: QuaExpressionType, **kwargs) -> "_BodyScope":
             play('pulse', 'element')
         ```
     """
-    if type(expression) == bool:
-        expression = exp(expression)
     body = _get_scope_as_blocks_body()
+    if type(expression) is bool:
+        if fold:
+            if expression:
+                return _FoldedIfScope(body, body)
+            return _FoldedIfScope(_StatementsCollection(_qua.QuaProgramStatementsCollection(statements=[])), body)
+        expression = exp(expression)
 
     # support unsafe for serializer
     if_kwargs = {}
@@ -961,6 +972,8 @@ def elif_(expression: QuaExpressionType) -> "_BodyScope":
         ```
     """
     body = _get_scope_as_blocks_body()
+    if body.ends_with_folded_if():
+        raise QmQuaException("'elif' statement cannot follow an 'if' statement folded with 'fold=True'.")
     last_statement = body.get_last_statement()
     if last_statement is None or betterproto.serialized_on_wire(last_statement.if_) is False:
         raise QmQuaException(
@@ -999,6 +1012,8 @@ def else_() -> "_BodyScope":
         ```
     """
     body = _get_scope_as_blocks_body()
+    if body.ends_with_folded_if():
+        raise QmQuaException("'else' statement cannot follow an 'if' statement folded with 'fold=True'.")
     last_statement = body.get_last_statement()
 
     if last_statement is None or betterproto.serialized_on_wire(last_statement.if_) is False:
@@ -1057,20 +1072,19 @@ def for_each_(var: OneOrMore[QuaVariableType], values: ForEachValuesType) -> "_B
             raise QmQuaException(f"for_each_ var {i} must be a variable")
 
     # normalize the values argument
-    if isinstance(values, _Expression) or not _is_iter(values) or not _is_iter(values[0]):
+    if isinstance(values, _Expression) or not _is_iter(values):
         values = (values,)
-
-    if _is_iter(values) and len(values) < 1:
+    elif len(values) < 1:
         raise QmQuaException("values cannot be empty")
+    elif not isinstance(values[0], (list, tuple, np.ndarray, _Expression)) and not _is_iter(values[0]):
+        values = (values,)
 
     arrays = []
     for value in values:
         if isinstance(value, _Expression):
             arrays.append(value)
         elif _is_iter(value):
-            has_bool = collection_has_type_bool(value)
-            has_int = collection_has_type_int(value)
-            has_float = collection_has_type_float(value)
+            has_bool, has_int, has_float = collection_number_types(value)
 
             if has_bool:
                 if has_int or has_float:
@@ -1087,15 +1101,13 @@ def for_each_(var: OneOrMore[QuaVariableType], values: ForEachValuesType) -> "_B
         else:
             raise QmQuaException("value is not a QUA array neither iterable")
 
-    var = [_unwrap_var(exp(v)) for v in var]
-    arrays = [a.unwrap() for a in arrays]
+    var = tuple(_unwrap_var(exp(v)) for v in var)
+    arrays = tuple(a.unwrap() for a in arrays)
 
     if len(var) != len(arrays):
         raise QmQuaException("number of variables does not match number of array values")
 
-    iterators = [(var[i], ar) for (i, ar) in enumerate(arrays)]
-
-    foreach = body.for_each(iterators)
+    foreach = body.for_each(tuple(zip(var, arrays)))
     return _BodyScope(foreach)
 
 
@@ -1207,7 +1219,7 @@ def infinite_loop_() -> "_BodyScope":
     """
     body = _get_scope_as_blocks_body()
     for_statement = body.for_block()
-    for_statement.condition = _unwrap_exp(exp(True))
+    for_statement.condition = _expressions.literal_bool(True)
     return _BodyScope(_StatementsCollection(for_statement.body))
 
 
@@ -1271,8 +1283,12 @@ def _declare(
 ) -> QuaVariableType:
     dim = 0
     if size is not None:
-        size = size.item() if isinstance(size, np.integer) else size
-        if not (isinstance(size, int) and size > 0):
+        if not isinstance(size, int):
+            # numpy scalars (and 0-d arrays) convert to python numbers through item()
+            item = getattr(size, "item", None)
+            if item is not None:
+                size = item()
+        if not isinstance(size, int) or isinstance(size, bool) or size <= 0:
             raise QmQuaException("size must be a positive integer")
         if value is not None:
             raise QmQuaException("size declaration cannot be made if value is declared")
@@ -1289,10 +1305,11 @@ def _declare(
 
     if dec_type == DeclarationType.InitArray:
         mem_size = len(value)
-        new_value = []
-        for val in value:
-            new_value.append(_to_expression(val).literal)
-        expression_value = new_value
+        if isinstance(value, np.ndarray) and value.dtype.kind in "biuf" and value.dtype != np.longdouble:
+            items = value.tolist()
+        else:
+            items = [_fix_object_data_type(val) for val in value]
+        expression_value = _expressions.literal_array(items)
         dim = 1
     elif dec_type == DeclarationType.InitScalar:
         mem_size = 1
@@ -1310,7 +1327,7 @@ def _declare(
     if dec_type == DeclarationType.EmptyArray or dec_type == DeclarationType.InitArray:
         if is_input_stream:
             if name is not None:
-                var = f"input_stream_{name}"
+                var = sys.intern(f"input_stream_{name}")
                 if var in scope.declared_input_streams:
                     raise QmQuaException("input stream already declared")
                 scope.declared_input_streams.add(var)
@@ -1318,12 +1335,12 @@ def _declare(
                 raise QmQuaException("input stream declared without a name")
         else:
             scope.array_index += 1
-            var = f"a{scope.array_index}"
+            var = sys.intern(f"a{scope.array_index}")
         result = _qua.QuaProgramArrayVarRefExpression(name=var)
     else:
         if is_input_stream:
             if name is not None:
-                var = f"input_stream_{name}"
+                var = sys.intern(f"input_stream_{name}")
                 if var in scope.declared_input_streams:
                     raise QmQuaException("input stream already declared")
                 scope.declared_input_streams.add(var)
@@ -1331,7 +1348,7 @@ def _declare(
                 raise QmQuaException("input stream declared without a name")
         else:
             scope.var_index += 1
-            var = f"v{scope.var_index}"
+            var = sys.intern(f"v{scope.var_index}")
         result = _qua.QuaProgramAnyScalarExpression(variable=_qua.QuaProgramVarRefExpression(name=var))
 
     prog = scope.program
@@ -1468,6 +1485,7 @@ def declare_stream(**kwargs) -> "_ResultSource":
     var = f"r{scope.result_index}"
     if is_adc_trace:
         var = "atr_" + var
+    var = sys.intern(var)
 
     return _ResultSource(
         _ResultSourceConfiguration(
@@ -1480,8 +1498,14 @@ def declare_stream(**kwargs) -> "_ResultSource":
     )
 
 
+_PYTHON_SCALAR_TYPES = frozenset((int, float, bool, str))
+_NUMPY_SCALAR_TYPES = (np.floating, np.integer, np.bool_)
+
+
 def _fix_object_data_type(obj):
-    if isinstance(obj, (np.floating, np.integer, np.bool_)):
+    if type(obj) in _PYTHON_SCALAR_TYPES:
+        return obj
+    if isinstance(obj, _NUMPY_SCALAR_TYPES):
         obj_item = obj.item()
         if isinstance(obj_item, np.longdouble):
             return float(obj_item)
@@ -1492,10 +1516,16 @@ def _fix_object_data_type(obj):
 
 
 def _to_expression(other: AllQuaTypes, index_exp: Optional[QuaNumberType] = None) -> MessageVariableOrExpression:
-    other = _fix_object_data_type(other)
-    if index_exp is not None and type(index_exp) is not _qua.QuaProgramAnyScalarExpression:
+    if index_exp is None:
+        # none of the table's types is a numpy scalar, so they can skip _fix_object_data_type
+        converter = _EXPRESSION_CONVERTERS.get(type(other))
+        if converter is not None:
+            return converter(other)
+    elif type(index_exp) is not _qua.QuaProgramAnyScalarExpression:
         index_exp = _to_expression(index_exp, None)
 
+    other = _fix_object_data_type(other)
+
     if index_exp is not None and type(other) is not _qua.QuaProgramArrayVarRefExpression:
         raise QmQuaException(f"{other} is not an array")
 
@@ -1519,9 +1549,34 @@ def _to_expression(other: AllQuaTypes, index_exp: Optional[QuaNumberType] = None
         raise QmQuaException(f"Can't handle {other}")
 
 
+_BinaryOperatorType = Callable[["_Expression", AllQuaTypes], "_Expression"]
+
+
+def _binary_operator(operator: str, reverse: bool = False) -> _BinaryOperatorType:
+    """Creates the method implementing ``operator`` on ``_Expression``, with the expression as the left operand
+    (or as the right one if ``reverse`` is set)
+    """
+    if reverse:
+
+        def reversed_operation(self: "_Expression", other: AllQuaTypes) -> "_Expression":
+            return _Expression(_expressions.binary(_to_expression(other), operator, self._expression))
+
+        return reversed_operation
+
+    def operation(self: "_Expression", other: AllQuaTypes) -> "_Expression":
+        return _Expression(_expressions.binary(self._expression, operator, _to_expression(other)))
+
+    return operation
+
+
 class _Expression:
+    __slots__ = ("_expression", "_assign_target", "_str", "_length")
+
     def __init__(self, expression: MessageVariableOrExpression):
         self._expression = expression
+        self._assign_target: Optional[_qua.QuaProgramAssignmentStatementTarget] = None
+        self._str: Optional[str] = None
+        self._length: Optional[_Expression] = None
 
     def __getitem__(self, item: QuaNumberType) -> QuaExpressionType:
         return _Expression(_to_expression(self._expression, item))
@@ -1533,117 +1588,53 @@ class _Expression:
         return self._expression is None
 
     def length(self) -> QuaExpressionType:
-        unwrapped_element = self.unwrap()
+        # the length expression carries no location, so the one built for an array is reused on every call
+        if self._length is not None:
+            return self._length
+        unwrapped_element = self._expression
         if isinstance(unwrapped_element, _qua.QuaProgramArrayVarRefExpression):
             array_exp = _qua.QuaProgramArrayLengthExpression(array=unwrapped_element)
-            array_exp.array = unwrapped_element
             result = _qua.QuaProgramAnyScalarExpression(array_length=array_exp)
-            return _Expression(result)
+            self._length = _Expression(result)
+            return self._length
         else:
             raise QmQuaException(f"{unwrapped_element} is not an array")
 
-    def __add__(self, other: AllQuaTypes) -> "_Expression":
-        other = _to_expression(other)
-        return _Expression(_expressions.binary(self._expression, "+", other))
-
-    def __radd__(self, other: AllQuaTypes) -> "_Expression":
-        other = _to_expression(other)
-        return _Expression(_expressions.binary(other, "+", self._expression))
-
-    def __sub__(self, other: AllQuaTypes) -> "_Expression":
-        other = _to_expression(other)
-        return _Expression(_expressions.binary(self._expression, "-", other))
-
-    def __rsub__(self, other: AllQuaTypes) -> "_Expression":
-        other = _to_expression(other)
-        return _Expression(_expressions.binary(other, "-", self._expression))
+    __add__ = _binary_operator("+")
+    __radd__ = _binary_operator("+", reverse=True)
+    __sub__ = _binary_operator("-")
+    __rsub__ = _binary_operator("-", reverse=True)
 
     def __neg__(self) -> "_Expression":
-        other = _to_expression(0)
-        return _Expression(_expressions.binary(other, "-", self._expression))
-
-    def __gt__(self, other: AllQuaTypes) -> "_Expression":
-        other = _to_expression(other)
-        return _Expression(_expressions.binary(self._expression, ">", other))
-
-    def __ge__(self, other: AllQuaTypes) -> "_Expression":
-        other = _to_expression(other)
-        return _Expression(_expressions.binary(self._expression, ">=", other))
-
-    def __lt__(self, other: AllQuaTypes) -> "_Expression":
-        other = _to_expression(other)
-        return _Expression(_expressions.binary(self._expression, "<", other))
-
-    def __le__(self, other: AllQuaTypes) -> "_Expression":
-        other = _to_expression(other)
-        return _Expression(_expressions.binary(self._expression, "<=", other))
-
-    def __eq__(self, other: AllQuaTypes) -> "_Expression":
-        other = _to_expression(other)
-        return _Expression(_expressions.binary(self._expression, "==", other))
-
-    def __mul__(self, other: AllQuaTypes) -> "_Expression":
-        other = _to_expression(other)
-        return _Expression(_expressions.binary(self._expression, "*", other))
-
-    def __rmul__(self, other: AllQuaTypes) -> "_Expression":
-        other = _to_expression(other)
-        return _Expression(_expressions.binary(other, "*", self._expression))
-
-    def __truediv__(self, other: AllQuaTypes) -> "_Expression":
-        other = _to_expression(other)
-        return _Expression(_expressions.binary(self._expression, "/", other))
-
-    def __rtruediv__(self, other: AllQuaTypes) -> "_Expression":
-        other = _to_expression(other)
-        return _Expression(_expressions.binary(other, "/", self._expression))
-
-    def __lshift__(self, other: AllQuaTypes) -> "_Expression":
-        other = _to_expression(other)
-        return _Expression(_expressions.binary(self._expression, "<<", other))
-
-    def __rlshift__(self, other: AllQuaTypes) -> "_Expression":
-        other = _to_expression(other)
-        return _Expression(_expressions.binary(other, "<<", self._expression))
-
-    def __rshift__(self, other: AllQuaTypes) -> "_Expression":
-        other = _to_expression(other)
-        return _Expression(_expressions.binary(self._expression, ">>", other))
-
-    def __rrshift__(self, other: AllQuaTypes) -> "_Expression":
-        other = _to_expression(other)
-        return _Expression(_expressions.binary(other, ">>", self._expression))
-
-    def __and__(self, other: AllQuaTypes) -> "_Expression":
-        other = _to_expression(other)
-        return _Expression(_expressions.binary(self._expression, "&", other))
-
-    def __rand__(self, other: AllQuaTypes) -> "_Expression":
-        other = _to_expression(other)
-        return _Expression(_expressions.binary(other, "&", self._expression))
-
-    def __or__(self, other: AllQuaTypes) -> "_Expression":
-        other = _to_expression(other)
-        return _Expression(_expressions.binary(self._expression, "|", other))
-
-    def __ror__(self, other: AllQuaTypes) -> "_Expression":
-        other = _to_expression(other)
-        return _Expression(_expressions.binary(other, "|", self._expression))
-
-    def __xor__(self, other: AllQuaTypes) -> "_Expression":
-        other = _to_expression(other)
-        return _Expression(_expressions.binary(self._expression, "^", other))
-
-    def __rxor__(self, other: AllQuaTypes) -> "_Expression":
-        other = _to_expression(other)
-        return _Expression(_expressions.binary(other, "^", self._expression))
+        return _Expression(_expressions.binary(_expressions.literal_int(0), "-", self._expression))
+
+    __gt__ = _binary_operator(">")
+    __ge__ = _binary_operator(">=")
+    __lt__ = _binary_operator("<")
+    __le__ = _binary_operator("<=")
+    __eq__ = _binary_operator("==")
+    __mul__ = _binary_operator("*")
+    __rmul__ = _binary_operator("*", reverse=True)
+    __truediv__ = _binary_operator("/")
+    __rtruediv__ = _binary_operator("/", reverse=True)
+    __lshift__ = _binary_operator("<<")
+    __rlshift__ = _binary_operator("<<", reverse=True)
+    __rshift__ = _binary_operator(">>")
+    __rrshift__ = _binary_operator(">>", reverse=True)
+    __and__ = _binary_operator("&")
+    __rand__ = _binary_operator("&", reverse=True)
+    __or__ = _binary_operator("|")
+    __ror__ = _binary_operator("|", reverse=True)
+    __xor__ = _binary_operator("^")
+    __rxor__ = _binary_operator("^", reverse=True)
 
     def __invert__(self) -> "_Expression":
-        other = _to_expression(True)
-        return _Expression(_expressions.binary(self._expression, "^", other))
+        return _Expression(_expressions.binary(self._expression, "^", _expressions.literal_bool(True)))
 
     def __str__(self) -> str:
-        return ExpressionSerializingVisitor.serialize(self._expression)
+        if self._str is None:
+            self._str = ExpressionSerializingVisitor.serialize(self._expression)
+        return self._str
 
     def __bool__(self):
         raise QmQuaException(
@@ -1652,34 +1643,62 @@ class _Expression:
         )
 
 
+_DEPRECATED_VARIABLE_ALIASES = {"isFixed": "is_fixed", "isInt": "is_int", "isBool": "is_bool"}
+_warned_variable_aliases: Set[str] = set()
+
+
 class _Variable(_Expression):
+    __slots__ = ("_type", "_is_fixed", "_is_int", "_is_bool")
+
     def __init__(self, expression: MessageVariableOrExpression, t: VariableDeclarationType):
         super().__init__(expression)
         self._type = t
-
-    @deprecated("1.1", "1.2", details="use: '_Variable.is_fixed()' instead")
-    def isFixed(self) -> bool:
-        return self.is_fixed()
-
-    @deprecated("1.1", "1.2", details="use: '_Variable.is_int()' instead")
-    def isInt(self) -> bool:
-        return self.is_int()
-
-    @deprecated("1.1", "1.2", details="use: '_Variable.is_bool()' instead")
-    def isBool(self) -> bool:
-        return self.is_bool()
+        # the type never changes after declaration, so the predicates below are decided once
+        self._is_fixed = t is fixed
+        self._is_int = t is int
+        self._is_bool = t is bool
+
+    def __getattr__(self, name: str):
+        # Only reached when normal lookup fails, so the deprecated camelCase aliases cost nothing for the rest of the
+        # API. Each alias warns once per process instead of on every call.
+        new_name = _DEPRECATED_VARIABLE_ALIASES.get(name)
+        if new_name is None:
+            raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+        if name not in _warned_variable_aliases:
+            _warned_variable_aliases.add(name)
+            warnings.warn(
+                DeprecatedWarning(name, "1.1", "1.2", details=f"use: '_Variable.{new_name}()' instead"),
+                category=DeprecationWarning,
+                stacklevel=2,
+            )
+        return getattr(self, new_name)
 
     def is_fixed(self) -> bool:
-        return self._type == fixed
+        return self._is_fixed
 
     def is_int(self) -> bool:
-        return self._type == int
+        return self._is_int
 
     def is_bool(self) -> bool:
-        return self._type == bool
+        return self._is_bool
+
+
+# Converters for the exact types that make up nearly all the operands of _to_expression, looked up before its general
+# isinstance chain (which still handles subclasses, indexing and the IO variables)
+_EXPRESSION_CONVERTERS: Dict[type, Callable[[AllQuaTypes], MessageVariableOrExpression]] = {
+    _Expression: _Expression.unwrap,
+    _Variable: _Expression.unwrap,
+    int: _expressions.literal_int,
+    bool: _expressions.literal_bool,
+    float: _expressions.literal_real,
+    _qua.QuaProgramVarRefExpression: lambda var: var,
+    _qua.QuaProgramArrayVarRefExpression: lambda array: _expressions.array(array, None),
+}
 
 
 class _PulseAmp:
+    __slots__ = ("v1", "v2", "v3", "v4")
+
     def __init__(
         self,
         v1: MessageExpressionType,
@@ -1753,8 +1772,13 @@ def amp(
         v4: The forth element in the amplitude matrix which multiples
             the `pulse` associated with the `operation`.
     """
-    variables: List[MessageExpressionType] = [_unwrap_exp(exp(v)) if v is not None else None for v in [v1, v2, v3, v4]]
-    return _PulseAmp(*variables)
+    # _to_expression(v) is what _unwrap_exp(exp(v)) reduces to, without the intermediate _Expression
+    return _PulseAmp(
+        _to_expression(v1) if v1 is not None else None,
+        _to_expression(v2) if v2 is not None else None,
+        _to_expression(v3) if v3 is not None else None,
+        _to_expression(v4) if v4 is not None else None,
+    )
 
 
 def _assert_scalar_expression(value: _Expression):
@@ -1762,12 +1786,9 @@ def _assert_scalar_expression(value: _Expression):
         raise QmQuaException(f"invalid expression: '{value}' is not a scalar expression")
 
 
-def _assert_not_lib_expression(value: _Expression):
-    expression = _unwrap_exp(value)
-    if (
-        isinstance(expression, _qua.QuaProgramAnyScalarExpression)
-        and betterproto.which_one_of(expression, "expression_oneof")[0] == "lib_function"
-    ):
+def _assert_not_lib_expression(value: _Expression, one_of: str):
+    # one_of is the "expression_oneof" field name of the scalar expression, already looked up by the caller
+    if one_of == "lib_function":
         raise QmQuaException(
             f"library expression {str(value)} is not a valid save source."
             f" Assign the value to a variable before saving it"
@@ -1795,24 +1816,29 @@ def ramp(v) -> _qua.QuaProgramRampPulse:
 
 
 def exp(value: AllQuaTypes) -> QuaExpressionType:
+    if isinstance(value, _Expression):
+        # expressions are immutable, re-wrapping them only discards the cached unwrap results
+        return value
     return _Expression(_to_expression(value))
 
 
 class _BaseScope:
+    __slots__ = ()
+
     def __enter__(self):
-        global _block_stack
         _block_stack.append(self)
         return None
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        global _block_stack
-        if _block_stack[-1] != self:
+        if _block_stack[-1] is not self:
             raise QmQuaException("Unexpected stack structure")
-        _block_stack.remove(self)
+        _block_stack.pop()
         return False
 
 
 class _BodyScope(_BaseScope):
+    __slots__ = ("_body",)
+
     def __init__(self, body: Optional[_StatementsCollection]):
         super().__init__()
         self._body = body
@@ -1821,7 +1847,33 @@ class _BodyScope(_BaseScope):
         return self._body
 
 
+class _FoldedIfScope(_BodyScope):
+    """The scope of an ``if_()`` folded when the program is built, which marks where it ended in the enclosing body so
+    that an ``elif_()`` or ``else_()`` cannot attach to an earlier, unrelated ``if`` statement
+    """
+
+    __slots__ = ("_enclosing_body",)
+
+    def __init__(self, body: _StatementsCollection, enclosing_body: _StatementsCollection):
+        super().__init__(body)
+        self._enclosing_body = enclosing_body
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._enclosing_body.mark_folded_if()
+        return super().__exit__(exc_type, exc_val, exc_tb)
+
+
 class _ProgramScope(_BodyScope):
+    __slots__ = (
+        "_program",
+        "var_index",
+        "array_index",
+        "result_index",
+        "declared_input_streams",
+        "declared_library_arrays",
+        "_declared_streams",
+    )
+
     def __init__(self, _program: "Program"):
         super().__init__(_program.body)
         self._program = _program
@@ -1829,6 +1881,7 @@ class _ProgramScope(_BodyScope):
         self.array_index = 0
         self.result_index = 0
         self.declared_input_streams: Set[str] = set()
+        self.declared_library_arrays: Dict[Tuple[Tuple[type, Any], ...], _Variable] = {}
         self._declared_streams: Dict[str, _ResultSource] = {}
 
     def __enter__(self) -> "Program":
@@ -1851,16 +1904,15 @@ class _ProgramScope(_BodyScope):
             result_object = declare_stream(adc_trace=True)
             self._declared_streams[tag] = result_object
 
-            ra = _get_scope_as_result_analysis()
-            ra.auto_save_all(tag + "_input1", result_object.input1())
-            ra.auto_save_all(
-                tag + "_input1" + _TIMESTAMPS_LEGACY_SUFFIX,
-                result_object.input1().timestamps(),
-            )
-            ra.auto_save_all(tag + "_input2", result_object.input2())
-            ra.auto_save_all(
-                tag + "_input2" + _TIMESTAMPS_LEGACY_SUFFIX,
-                result_object.input2().timestamps(),
+            input1_tag, input1 = tag + "_input1", result_object.input1()
+            input2_tag, input2 = tag + "_input2", result_object.input2()
+            _get_scope_as_result_analysis().auto_save_all_many(
+                (
+                    (input1_tag, input1),
+                    (input1_tag + _TIMESTAMPS_LEGACY_SUFFIX, input1.timestamps()),
+                    (input2_tag, input2),
+                    (input2_tag + _TIMESTAMPS_LEGACY_SUFFIX, input2.timestamps()),
+                )
             )
 
         return result_object
@@ -1883,6 +1935,8 @@ class _ProgramScope(_BodyScope):
 
 
 class _ForScope(_BodyScope):
+    __slots__ = ("_for_statement",)
+
     def __init__(self, for_statement: _qua.QuaProgramForStatement):
         super().__init__(None)
         self._for_statement = for_statement
@@ -1895,13 +1949,22 @@ class _ForScope(_BodyScope):
 
 
 class _SwitchScope(_BaseScope):
+    __slots__ = ("expression", "if_statement", "elseifs", "container", "unsafe")
+
     def __init__(self, expression: _Expression, container: _StatementsCollection, unsafe: bool):
         super().__init__()
         self.expression = expression
         self.if_statement: Optional[_qua.QuaProgramAnyStatement] = None
+        # the cases following the first one, attached to the if statement in one go when the switch is closed
+        self.elseifs: List[_qua.QuaProgramElseIf] = []
         self.container = container
         self.unsafe = unsafe
 
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if self.if_statement is not None and self.elseifs:
+            self.if_statement.if_.elseifs = self.elseifs
+        return super().__exit__(exc_type, exc_val, exc_tb)
+
 
 def strict_timing_() -> _BodyScope:
     """Any QUA command written within the strict timing block will be required to to play without gaps.
@@ -1919,6 +1982,8 @@ def strict_timing_() -> _BodyScope:
 
 
 class _RAScope(_BaseScope):
+    __slots__ = ("_ra",)
+
     def __init__(self, ra: _ResultAnalysis):
         super().__init__()
         self._ra = ra
@@ -1932,55 +1997,59 @@ class _RAScope(_BaseScope):
 
 
 def _get_root_program_scope() -> _ProgramScope:
-    global _block_stack
-    if type(_block_stack[0]) != _ProgramScope:
+    scope = _block_stack[0]
+    if type(scope) is not _ProgramScope:
         raise QmQuaException("Expecting program scope")
-    return _block_stack[0]
+    return scope
 
 
 def _get_scope_as_program() -> "Program":
-    global _block_stack
-    if type(_block_stack[-1]) != _ProgramScope:
+    scope = _block_stack[-1]
+    if type(scope) is not _ProgramScope:
         raise QmQuaException("Expecting program scope")
-    return _block_stack[-1].program
+    return scope.program
 
 
 def _get_scope_as_for() -> _qua.QuaProgramForStatement:
-    global _block_stack
-    if type(_block_stack[-1]) != _ForScope:
+    scope = _block_stack[-1]
+    if type(scope) is not _ForScope:
         raise QmQuaException("Expecting for scope")
-    return _block_stack[-1].for_statement()
+    return scope.for_statement()
 
 
 def _get_scope_as_blocks_body() -> _StatementsCollection:
-    global _block_stack
-    if not issubclass(type(_block_stack[-1]), _BodyScope):
+    scope = _block_stack[-1]
+    if not isinstance(scope, _BodyScope):
         raise QmQuaException("Expecting scope with body.")
-    return _block_stack[-1].body()
+    return scope.body()
 
 
 def _get_scope_as_switch_scope() -> _SwitchScope:
-    global _block_stack
-    if type(_block_stack[-1]) != _SwitchScope:
+    scope = _block_stack[-1]
+    if type(scope) is not _SwitchScope:
         raise QmQuaException("Expecting switch scope")
-    return _block_stack[-1]
+    return scope
 
 
 def _get_scope_as_result_analysis() -> _ResultAnalysis:
-    global _block_stack
     return _get_root_program_scope().program.result_analysis
 
 
+def _invalid_expression_error(expression: AllQuaTypes) -> QmQuaException:
+    # Only built on the error path, keeping the string conversion out of the unwrap helpers below
+    return QmQuaException(f"invalid expression: {expression}")
+
+
 def _unwrap_exp(expression: _Expression) -> MessageVariableOrExpression:
     if not isinstance(expression, _Expression):
-        raise QmQuaException("invalid expression: " + str(expression))
-    return expression.unwrap()
+        raise _invalid_expression_error(expression)
+    return expression._expression
 
 
 def _unwrap_var(expression: _Expression) -> MessageVarType:
     var = _unwrap_exp(expression)
     if type(var) is not _qua.QuaProgramAnyScalarExpression:
-        raise QmQuaException("invalid expression: " + str(expression))
+        raise _invalid_expression_error(expression)
     return var.variable
 
 
@@ -1989,50 +2058,47 @@ def _unwrap_array_cell(
 ) -> _qua.QuaProgramArrayCellRefExpression:
     var = _unwrap_exp(expression)
     if type(var) is not _qua.QuaProgramAnyScalarExpression:
-        raise QmQuaException("invalid expression: " + str(expression))
+        raise _invalid_expression_error(expression)
     return var.array_cell
 
 
+# The scalar expression oneof fields that the target/source messages below mirror under the same names, so the
+# unwrapped expression can be passed straight through as a keyword argument
+_ASSIGN_TARGET_FIELDS = frozenset(("variable", "array_cell"))
+_SAVE_SOURCE_FIELDS = frozenset(("variable", "array_cell", "literal"))
+
+
 def _unwrap_assign_target(
     expression: _Expression,
 ) -> _qua.QuaProgramAssignmentStatementTarget:
-    result = _qua.QuaProgramAssignmentStatementTarget()
+    if isinstance(expression, _Expression) and expression._assign_target is not None:
+        return expression._assign_target
 
     target = _unwrap_exp(expression)
     if type(target) is _qua.QuaProgramAnyScalarExpression:
         one_of, found = betterproto.which_one_of(target, "expression_oneof")
-        if one_of == "array_cell":
-            result.array_cell = target.array_cell
-        elif one_of == "variable":
-            result.variable = target.variable
-        else:
+        if one_of not in _ASSIGN_TARGET_FIELDS:
             raise QmQuaException("invalid target expression: " + str(expression))
+        result = _qua.QuaProgramAssignmentStatementTarget(**{one_of: found})
     # We don't support whole array assignment for now
     # elif type(target) is _Q.ArrayVarRefExpression:
     #     result.arrayVar.CopyFrom(target.arrayVar)
     else:
         raise QmQuaException("invalid target expression: " + str(expression))
 
+    expression._assign_target = result
     return result
 
 
 def _unwrap_save_source(expression: _Expression) -> _qua.QuaProgramSaveStatementSource:
-    result = _qua.QuaProgramSaveStatementSource()
-
     source = _unwrap_exp(expression)
     _assert_scalar_expression(expression)
-    _assert_not_lib_expression(expression)
     one_of, found = betterproto.which_one_of(source, "expression_oneof")
-    if one_of == "array_cell":
-        result.array_cell = source.array_cell
-    elif one_of == "variable":
-        result.variable = source.variable
-    elif one_of == "literal":
-        result.literal = source.literal
-    else:
+    _assert_not_lib_expression(expression, one_of)
+    if one_of not in _SAVE_SOURCE_FIELDS:
         raise QmQuaException("invalid source expression: " + str(expression))
 
-    return result
+    return _qua.QuaProgramSaveStatementSource(**{one_of: found})
 
 
 def _unwrap_outer_target(
@@ -2040,26 +2106,19 @@ def _unwrap_outer_target(
 ) -> _qua.QuaProgramAnalogProcessTarget:
     outer_target = _qua.QuaProgramAnalogProcessTarget()
     if isinstance(analog_process_target, AnalogMeasureProcess.ScalarProcessTarget):
-        target = _qua.QuaProgramAnalogProcessTargetScalarProcessTarget()
         target_exp = _unwrap_exp(analog_process_target.target)
         if not isinstance(target_exp, _qua.QuaProgramAnyScalarExpression):
             raise QmQuaException()
 
         target_type, found = betterproto.which_one_of(target_exp, "expression_oneof")
-        if target_type == "variable":
-            target.variable = target_exp.variable
-        elif target_type == "array_cell":
-            target.array_cell = target_exp.array_cell
-        else:
+        if target_type not in _ASSIGN_TARGET_FIELDS:
             raise QmQuaException()
-        outer_target.scalar_process = target
+        outer_target.scalar_process = _qua.QuaProgramAnalogProcessTargetScalarProcessTarget(**{target_type: found})
 
     elif isinstance(analog_process_target, AnalogMeasureProcess.VectorProcessTarget):
         target = _qua.QuaProgramAnalogProcessTargetVectorProcessTarget(
             array=_unwrap_exp(analog_process_target.target),
-            time_division=_qua.QuaProgramAnalogProcessTargetTimeDivision().from_dict(
-                _unwrap_time_division(analog_process_target.time_division).to_dict()
-            ),
+            time_division=_unwrap_time_division(analog_process_target.time_division),
         )
         outer_target.vector_process = target
     else:
@@ -2067,83 +2126,135 @@ def _unwrap_outer_target(
     return outer_target
 
 
+def _unwrap_bare_integration(
+    result: _qua.QuaProgramAnalogMeasureProcess, analog_process: AnalogMeasureProcess.BareIntegration
+) -> None:
+    result.bare_integration = _qua.QuaProgramAnalogMeasureProcessBareIntegration(
+        integration=_qua.QuaProgramIntegrationWeightReference(name=analog_process.iw),
+        element_output=analog_process.element_output,
+        target=_unwrap_outer_target(analog_process.target),
+    )
+
+
+def _unwrap_dual_bare_integration(
+    result: _qua.QuaProgramAnalogMeasureProcess, analog_process: AnalogMeasureProcess.DualBareIntegration
+) -> None:
+    result.dual_bare_integration = _qua.QuaProgramAnalogMeasureProcessDualBareIntegration(
+        integration1=_qua.QuaProgramIntegrationWeightReference(name=analog_process.iw1),
+        integration2=_qua.QuaProgramIntegrationWeightReference(name=analog_process.iw2),
+        element_output1=analog_process.element_output1,
+        element_output2=analog_process.element_output2,
+        target=_unwrap_outer_target(analog_process.target),
+    )
+
+
+def _unwrap_demod_integration(
+    result: _qua.QuaProgramAnalogMeasureProcess, analog_process: AnalogMeasureProcess.DemodIntegration
+) -> None:
+    result.demod_integration = _qua.QuaProgramAnalogMeasureProcessDemodIntegration(
+        integration=_qua.QuaProgramIntegrationWeightReference(name=analog_process.iw),
+        element_output=analog_process.element_output,
+        target=_unwrap_outer_target(analog_process.target),
+    )
+
+
+def _unwrap_dual_demod_integration(
+    result: _qua.QuaProgramAnalogMeasureProcess, analog_process: AnalogMeasureProcess.DualDemodIntegration
+) -> None:
+    result.dual_demod_integration = _qua.QuaProgramAnalogMeasureProcessDualDemodIntegration(
+        integration1=_qua.QuaProgramIntegrationWeightReference(name=analog_process.iw1),
+        integration2=_qua.QuaProgramIntegrationWeightReference(name=analog_process.iw2),
+        element_output1=analog_process.element_output1,
+        element_output2=analog_process.element_output2,
+        target=_unwrap_outer_target(analog_process.target),
+    )
+
+
+def _unwrap_analog_raw_time_tagging(
+    result: _qua.QuaProgramAnalogMeasureProcess, analog_process: AnalogMeasureProcess.RawTimeTagging
+) -> None:
+    result.raw_time_tagging = _qua.QuaProgramAnalogMeasureProcessRawTimeTagging(
+        max_time=int(analog_process.max_time),
+        element_output=analog_process.element_output,
+        target=_unwrap_exp(analog_process.target),
+    )
+    if analog_process.targetLen is not None:
+        result.raw_time_tagging.target_len = _unwrap_exp(analog_process.targetLen).variable
+
+
+def _unwrap_high_res_time_tagging(
+    result: _qua.QuaProgramAnalogMeasureProcess, analog_process: AnalogMeasureProcess.HighResTimeTagging
+) -> None:
+    result.high_res_time_tagging = _qua.QuaProgramAnalogMeasureProcessHighResTimeTagging(
+        max_time=int(analog_process.max_time),
+        element_output=analog_process.element_output,
+        target=_unwrap_exp(analog_process.target),
+    )
+    if analog_process.targetLen is not None:
+        result.high_res_time_tagging.target_len = _unwrap_exp(analog_process.targetLen).variable
+
+
+_ANALOG_PROCESS_UNWRAPPERS = {
+    AnalogMeasureProcess.BareIntegration: _unwrap_bare_integration,
+    AnalogMeasureProcess.DualBareIntegration: _unwrap_dual_bare_integration,
+    AnalogMeasureProcess.DemodIntegration: _unwrap_demod_integration,
+    AnalogMeasureProcess.DualDemodIntegration: _unwrap_dual_demod_integration,
+    AnalogMeasureProcess.RawTimeTagging: _unwrap_analog_raw_time_tagging,
+    AnalogMeasureProcess.HighResTimeTagging: _unwrap_high_res_time_tagging,
+}
+
+
 def _unwrap_analog_process(
     analog_process: AnalogMeasureProcess,
 ) -> _qua.QuaProgramAnalogMeasureProcess:
     result = _qua.QuaProgramAnalogMeasureProcess(loc=analog_process.loc)
 
-    if type(analog_process) == AnalogMeasureProcess.BareIntegration:
-        result.bare_integration = _qua.QuaProgramAnalogMeasureProcessBareIntegration(
-            integration=_qua.QuaProgramIntegrationWeightReference(name=analog_process.iw),
-            element_output=analog_process.element_output,
-            target=_unwrap_outer_target(analog_process.target),
-        )
-    elif type(analog_process) == AnalogMeasureProcess.DualBareIntegration:
-        result.dual_bare_integration = _qua.QuaProgramAnalogMeasureProcessDualBareIntegration(
-            integration1=_qua.QuaProgramIntegrationWeightReference(name=analog_process.iw1),
-            integration2=_qua.QuaProgramIntegrationWeightReference(name=analog_process.iw2),
-            element_output1=analog_process.element_output1,
-            element_output2=analog_process.element_output2,
-            target=_unwrap_outer_target(analog_process.target),
-        )
-    elif type(analog_process) == AnalogMeasureProcess.DemodIntegration:
-        result.demod_integration = _qua.QuaProgramAnalogMeasureProcessDemodIntegration(
-            integration=_qua.QuaProgramIntegrationWeightReference(name=analog_process.iw),
-            element_output=analog_process.element_output,
-            target=_unwrap_outer_target(analog_process.target),
-        )
-    elif type(analog_process) == AnalogMeasureProcess.DualDemodIntegration:
-        result.dual_demod_integration = _qua.QuaProgramAnalogMeasureProcessDualDemodIntegration(
-            integration1=_qua.QuaProgramIntegrationWeightReference(name=analog_process.iw1),
-            integration2=_qua.QuaProgramIntegrationWeightReference(name=analog_process.iw2),
-            element_output1=analog_process.element_output1,
-            element_output2=analog_process.element_output2,
-            target=_unwrap_outer_target(analog_process.target),
-        )
-    elif type(analog_process) == AnalogMeasureProcess.RawTimeTagging:
-        result.raw_time_tagging = _qua.QuaProgramAnalogMeasureProcessRawTimeTagging(
-            max_time=int(analog_process.max_time),
-            element_output=analog_process.element_output,
-            target=_unwrap_exp(analog_process.target),
-        )
-        if analog_process.targetLen is not None:
-            result.raw_time_tagging.target_len = _unwrap_exp(analog_process.targetLen).variable
-
-    elif type(analog_process) == AnalogMeasureProcess.HighResTimeTagging:
-        result.high_res_time_tagging = _qua.QuaProgramAnalogMeasureProcessHighResTimeTagging(
-            max_time=int(analog_process.max_time),
-            element_output=analog_process.element_output,
-            target=_unwrap_exp(analog_process.target),
-        )
-        if analog_process.targetLen is not None:
-            result.high_res_time_tagging.target_len = _unwrap_exp(analog_process.targetLen).variable
+    unwrapper = _ANALOG_PROCESS_UNWRAPPERS.get(type(analog_process))
+    if unwrapper is not None:
+        unwrapper(result, analog_process)
 
     return result
 
 
+def _unwrap_digital_raw_time_tagging(
+    result: _qua.QuaProgramDigitalMeasureProcess, digital_process: DigitalMeasureProcess.RawTimeTagging
+) -> None:
+    result.raw_time_tagging = _qua.QuaProgramDigitalMeasureProcessRawTimeTagging(
+        max_time=int(digital_process.max_time),
+        element_output=digital_process.element_output,
+        target=_unwrap_exp(digital_process.target),
+    )
+    if digital_process.targetLen is not None:
+        result.raw_time_tagging.target_len = _unwrap_exp(digital_process.targetLen).variable
+
+
+def _unwrap_counting(
+    result: _qua.QuaProgramDigitalMeasureProcess, digital_process: DigitalMeasureProcess.Counting
+) -> None:
+    result.counting = _qua.QuaProgramDigitalMeasureProcessCounting(
+        max_time=int(digital_process.max_time),
+        target=_unwrap_exp(digital_process.target).variable,
+    )
+    if type(digital_process.element_outputs) is tuple:
+        result.counting.element_outputs.extend(digital_process.element_outputs)
+    elif type(digital_process.element_outputs) is str:
+        result.counting.element_outputs.append(digital_process.element_outputs)
+
+
+_DIGITAL_PROCESS_UNWRAPPERS = {
+    DigitalMeasureProcess.RawTimeTagging: _unwrap_digital_raw_time_tagging,
+    DigitalMeasureProcess.Counting: _unwrap_counting,
+}
+
+
 def _unwrap_digital_process(
     digital_process: DigitalMeasureProcess,
 ) -> _qua.QuaProgramDigitalMeasureProcess:
     result = _qua.QuaProgramDigitalMeasureProcess(loc=digital_process.loc)
 
-    if type(digital_process) == DigitalMeasureProcess.RawTimeTagging:
-        result.raw_time_tagging = _qua.QuaProgramDigitalMeasureProcessRawTimeTagging(
-            max_time=int(digital_process.max_time),
-            element_output=digital_process.element_output,
-            target=_unwrap_exp(digital_process.target),
-        )
-        if digital_process.targetLen is not None:
-            result.raw_time_tagging.target_len = _unwrap_exp(digital_process.targetLen).variable
-
-    elif type(digital_process) == DigitalMeasureProcess.Counting:
-        result.counting = _qua.QuaProgramDigitalMeasureProcessCounting(
-            max_time=int(digital_process.max_time),
-            target=_unwrap_exp(digital_process.target).variable,
-        )
-        if type(digital_process.element_outputs) == tuple:
-            result.counting.element_outputs.extend(digital_process.element_outputs)
-        elif type(digital_process.element_outputs) == str:
-            result.counting.element_outputs.append(digital_process.element_outputs)
+    unwrapper = _DIGITAL_PROCESS_UNWRAPPERS.get(type(digital_process))
+    if unwrapper is not None:
+        unwrapper(result, digital_process)
 
     return result
 
@@ -2161,29 +2272,54 @@ def _unwrap_measure_process(
     return result
 
 
+def _unwrap_sliced(
+    result: _qua.QuaProgramAnalogProcessTargetTimeDivision,
+    time_division: AnalogMeasureProcess.SlicedAnalogTimeDivision,
+) -> None:
+    result.sliced = _qua.QuaProgramAnalogTimeDivisionSliced(samples_per_chunk=time_division.samples_per_chunk)
+
+
+def _unwrap_accumulated(
+    result: _qua.QuaProgramAnalogProcessTargetTimeDivision,
+    time_division: AnalogMeasureProcess.AccumulatedAnalogTimeDivision,
+) -> None:
+    result.accumulated = _qua.QuaProgramAnalogTimeDivisionAccumulated(samples_per_chunk=time_division.samples_per_chunk)
+
+
+def _unwrap_moving_window(
+    result: _qua.QuaProgramAnalogProcessTargetTimeDivision,
+    time_division: AnalogMeasureProcess.MovingWindowAnalogTimeDivision,
+) -> None:
+    result.moving_window = _qua.QuaProgramAnalogTimeDivisionMovingWindow(
+        samples_per_chunk=time_division.samples_per_chunk,
+        chunks_per_window=time_division.chunks_per_window,
+    )
+
+
+_TIME_DIVISION_UNWRAPPERS = {
+    AnalogMeasureProcess.SlicedAnalogTimeDivision: _unwrap_sliced,
+    AnalogMeasureProcess.AccumulatedAnalogTimeDivision: _unwrap_accumulated,
+    AnalogMeasureProcess.MovingWindowAnalogTimeDivision: _unwrap_moving_window,
+}
+
+
 def _unwrap_time_division(
     time_division: TimeDivisionType,
 ) -> _qua.QuaProgramAnalogProcessTargetTimeDivision:
     result = _qua.QuaProgramAnalogProcessTargetTimeDivision()
 
-    if type(time_division) == AnalogMeasureProcess.SlicedAnalogTimeDivision:
-        result.sliced = _qua.QuaProgramAnalogTimeDivisionSliced(samples_per_chunk=time_division.samples_per_chunk)
-    elif type(time_division) == AnalogMeasureProcess.AccumulatedAnalogTimeDivision:
-        result.accumulated = _qua.QuaProgramAnalogTimeDivisionAccumulated(
-            samples_per_chunk=time_division.samples_per_chunk
-        )
-    elif type(time_division) == AnalogMeasureProcess.MovingWindowAnalogTimeDivision:
-        result.moving_window = _qua.QuaProgramAnalogTimeDivisionMovingWindow(
-            samples_per_chunk=time_division.samples_per_chunk,
-            chunks_per_window=time_division.chunks_per_window,
-        )
+    unwrapper = _TIME_DIVISION_UNWRAPPERS.get(type(time_division))
+    if unwrapper is not None:
+        unwrapper(result, time_division)
+
     return result
 
 
 class AccumulationMethod:
+    return_func: Type[AnalogMeasureProcess] = None
+
     def __init__(self):
         self.loc = ""
-        self.return_func: Type[AnalogMeasureProcess] = None
 
     def _full_target(self, target: QuaVariableType) -> AnalogMeasureProcess.ScalarProcessTarget:
         return AnalogMeasureProcess.ScalarProcessTarget(self.loc, target)
@@ -2418,31 +2554,19 @@ class DualAccumulationMethod(AccumulationMethod):
 
 
 class _Demod(RealAccumulationMethod):
-    def __init__(self):
-        super().__init__()
-        self.loc = ""
-        self.return_func = AnalogMeasureProcess.DemodIntegration
+    return_func = AnalogMeasureProcess.DemodIntegration
 
 
 class _BareIntegration(RealAccumulationMethod):
-    def __init__(self):
-        super().__init__()
-        self.loc = ""
-        self.return_func = AnalogMeasureProcess.BareIntegration
+    return_func = AnalogMeasureProcess.BareIntegration
 
 
 class _DualDemod(DualAccumulationMethod):
-    def __init__(self):
-        super().__init__()
-        self.loc = ""
-        self.return_func = AnalogMeasureProcess.DualDemodIntegration
+    return_func = AnalogMeasureProcess.DualDemodIntegration
 
 
 class _DualBareIntegration(DualAccumulationMethod):
-    def __init__(self):
-        super().__init__()
-        self.loc = ""
-        self.return_func = AnalogMeasureProcess.DualBareIntegration
+    return_func = AnalogMeasureProcess.DualBareIntegration
 
 
 class TimeTagging:
@@ -2593,6 +2717,51 @@ def stream_processing() -> _RAScope:
 CommandsType = List[str]
 
 
+@lru_cache(maxsize=16)
+def _format_ndarray(dtype: str, shape: Tuple[int, ...], data: bytes) -> Tuple[str, ...]:
+    # Keyed on the array content rather than on the array object, so an array that is changed in place is never
+    # served a stale result
+    values = np.frombuffer(data, dtype=dtype).reshape(shape)
+    return tuple(str(item) for item in list(values))
+
+
+# The exact types of nearly every scalar operand, checked with one set lookup before the full isinstance test
+_SCALAR_TYPES = frozenset((int, float, np.int32, np.int64, np.float32, np.float64))
+_NUMERIC_TYPES = (int, float, np.integer, np.floating)
+_BOOL_TYPES = (bool, np.bool_)
+
+
+def _is_scalar(value: OneOrMore[PyNumberType]) -> bool:
+    if type(value) in _SCALAR_TYPES:
+        return True
+    return isinstance(value, _NUMERIC_TYPES) and not isinstance(value, _BOOL_TYPES)
+
+
+_ARRAY_TYPES = frozenset((list, tuple, np.ndarray))
+_TEXT_TYPES = (str, bytes)
+
+
+def _is_vector(value: OneOrMore[PyNumberType]) -> bool:
+    # lists, tuples and arrays are by far the common vector arguments, so they are checked first. Text has a length but
+    # is never a vector. Only what is left goes through the generic attribute probe.
+    if type(value) in _ARRAY_TYPES:
+        return True
+    if isinstance(value, _TEXT_TYPES):
+        return False
+    return hasattr(value, "__len__")
+
+
+def _array_to_command(values: PyNumberArrayType) -> CommandsType:
+    """Formats a constant vector as a stream processing ``@array`` argument. The formatting of numeric numpy arrays
+    is cached, as the same weights are typically used by many streams.
+    """
+    if isinstance(values, np.ndarray) and values.dtype.kind in "biuf":
+        items = _format_ndarray(values.dtype.str, values.shape, values.tobytes())
+    else:
+        items = [str(item) for item in list(values)]
+    return ["@array", *items]
+
+
 class _Functions:
     @staticmethod
     def average(axis: OneOrMore[PyNumberType] = None) -> CommandsType:
@@ -2609,12 +2778,9 @@ class _Functions:
         if axis is None:
             return ["average"]
         else:
-            if hasattr(axis, "__len__"):
+            if _is_vector(axis):
                 # vector
-                return [
-                    "average",
-                    ["@array"] + [str(item) for item in list(axis)],
-                ]
+                return ["average", _array_to_command(axis)]
             else:
                 # scalar
                 return ["average", str(axis)]
@@ -2629,7 +2795,7 @@ class _Functions:
         Returns:
             stream object
         """
-        return ["dot", ["@array"] + [str(item) for item in list(vector)]]
+        return ["dot", _array_to_command(vector)]
 
     @staticmethod
     def tuple_dot_product() -> CommandsType:
@@ -2652,12 +2818,9 @@ class _Functions:
         Returns:
             stream object
         """
-        if hasattr(scalar_or_vector, "__len__"):
+        if _is_vector(scalar_or_vector):
             # vector
-            return [
-                "vmult",
-                ["@array"] + [str(item) for item in list(scalar_or_vector)],
-            ]
+            return ["vmult", _array_to_command(scalar_or_vector)]
         else:
             # scalar
             return ["smult", str(scalar_or_vector)]
@@ -2689,7 +2852,7 @@ class _Functions:
         return [
             "conv",
             str(mode),
-            ["@array"] + [str(item) for item in list(constant_vector)],
+            _array_to_command(constant_vector),
         ]
 
     @staticmethod
@@ -2790,34 +2953,36 @@ class _Functions:
             stream processing demodulation will be invalid.
 
         """
-        if hasattr(iw_cos, "__len__"):
-            iw_cos = ["@array"] + [str(item) for item in list(iw_cos)]
+        if _is_vector(iw_cos):
+            iw_cos = _array_to_command(iw_cos)
         else:
             iw_cos = str(iw_cos)
-        if hasattr(iw_sin, "__len__"):
-            iw_sin = ["@array"] + [str(item) for item in list(iw_sin)]
+        if _is_vector(iw_sin):
+            iw_sin = _array_to_command(iw_sin)
         else:
             iw_sin = str(iw_sin)
-        out = ["demod", str(frequency), iw_cos, iw_sin]
         if type(integrate) is bool:
-            out.append("1" if integrate else "0")
-        return out
+            return ["demod", str(frequency), iw_cos, iw_sin, "1" if integrate else "0"]
+        return ["demod", str(frequency), iw_cos, iw_sin]
 
 
 FUNCTIONS = _Functions()
 
 
 class _ResultStream:
+    __slots__ = ("_operator_array", "_proto")
+
     def __init__(
         self,
         input_stream: Optional[Union[CommandsType, "_ResultStream"]],
         operator_array: Optional[CommandsType],
     ):
         if operator_array is not None:
-            self._operator_array = [*operator_array]
-            self._operator_array.append(input_stream)
+            self._operator_array = [*operator_array, input_stream]
         else:
             self._operator_array = input_stream
+        # Streams are never changed after construction, so a pipeline shared by several outputs is serialized once
+        self._proto: Optional[CommandsType] = None
 
     def average(self) -> "_ResultStream":
         """
@@ -2924,10 +3089,14 @@ class _ResultStream:
                 bin. example: [[1,10],[11,20]] - two bins, one between 1
                 and 10, second between 11 and 20
         """
-        converted_bins = []
-        for sub_list in list(bins):
-            converted_bins = converted_bins + [["@array"] + [str(item) for item in list(sub_list)]]
-        return _ResultStream(self, ["histogram", ["@array"] + converted_bins])
+        if isinstance(bins, np.ndarray) and bins.ndim == 2 and bins.dtype.kind in "biuf":
+            # format all the edges in one cached call, then split them back into bins
+            edges = _format_ndarray(bins.dtype.str, (bins.size,), bins.tobytes())
+            width = bins.shape[1]
+            converted_bins = [["@array", *edges[i * width : (i + 1) * width]] for i in range(bins.shape[0])]
+        else:
+            converted_bins = [_array_to_command(sub_list) for sub_list in list(bins)]
+        return _ResultStream(self, ["histogram", ["@array", *converted_bins]])
 
     def zip(self, other: "_ResultStream") -> "_ResultStream":
         """Combine the emissions of two streams to one item that is a tuple of items of input streams
@@ -2963,13 +3132,13 @@ class _ResultStream:
         Args:
             vector: constant vector of numbers
         """
-        return self.map(FUNCTIONS.dot_product(vector))
+        return _ResultStream(self, ["map", FUNCTIONS.dot_product(vector)])
 
     def tuple_dot_product(self) -> "_ResultStream":
         """
         Computes dot product of the given item of the input stream - that should include two vectors
         """
-        return self.map(FUNCTIONS.tuple_dot_product())
+        return _ResultStream(self, ["map", FUNCTIONS.tuple_dot_product()])
 
     def multiply_by(self, scalar_or_vector: OneOrMore[PyNumberType]) -> "_ResultStream":
         """Multiply the input stream item by a constant scalar or vector.
@@ -2979,14 +3148,14 @@ class _ResultStream:
             scalar_or_vector: either a scalar number, or a vector of
                 scalars.
         """
-        return self.map(FUNCTIONS.multiply_by(scalar_or_vector))
+        return _ResultStream(self, ["map", FUNCTIONS.multiply_by(scalar_or_vector)])
 
     def tuple_multiply(self) -> "_ResultStream":
         """
         Computes multiplication of the given item of the input stream - that can be any
         combination of scalar and vectors.
         """
-        return self.map(FUNCTIONS.tuple_multiply())
+        return _ResultStream(self, ["map", FUNCTIONS.tuple_multiply()])
 
     def convolution(self, constant_vector: PyNumberArrayType, mode: Optional[str] = None) -> "_ResultStream":
         """Computes discrete, linear convolution of one-dimensional constant vector and one-dimensional vector
@@ -2996,7 +3165,7 @@ class _ResultStream:
             constant_vector: vector of numbers
             mode: "full", "same" or "valid"
         """
-        return self.map(FUNCTIONS.convolution(constant_vector, mode))
+        return _ResultStream(self, ["map", FUNCTIONS.convolution(constant_vector, mode)])
 
     def tuple_convolution(self, mode: Optional[str] = None) -> "_ResultStream":
         """Computes discrete, linear convolution of two one-dimensional vectors that received as the one item from the input stream
@@ -3004,7 +3173,7 @@ class _ResultStream:
         Args:
             mode: "full", "same" or "valid"
         """
-        return self.map(FUNCTIONS.tuple_convolution(mode))
+        return _ResultStream(self, ["map", FUNCTIONS.tuple_convolution(mode)])
 
     def fft(self, output: Optional[str] = None) -> "_ResultStream":
         """Computes one-dimensional discrete fourier transform for every item in the
@@ -3029,30 +3198,50 @@ class _ResultStream:
         Returns:
             stream object
         """
-        return self.map(FUNCTIONS.fft(output))
+        return _ResultStream(self, ["map", FUNCTIONS.fft(output)])
 
     def boolean_to_int(self) -> "_ResultStream":
         """
         converts boolean to an integer number - 1 for true and 0 for false
         """
-        return self.map(FUNCTIONS.boolean_to_int())
+        return _ResultStream(self, ["map", FUNCTIONS.boolean_to_int()])
 
-    def _array_to_proto(self, array: List[Union[str, CommandsType, "_ResultStream", "_ResultSource"]]) -> CommandsType:
+    @staticmethod
+    def _array_to_proto(array: List[Union[str, CommandsType, "_ResultStream", "_ResultSource"]]) -> CommandsType:
+        # Walks nested lists and chained streams with an explicit stack rather than by recursion, so long pipelines
+        # don't pay a Python frame per level
         res = []
-        for x in array:
-            if isinstance(x, str):
-                res.append(x)
-            elif isinstance(x, list):
-                res.append(self._array_to_proto(x))
-            elif isinstance(x, _ResultSource):
-                res.append(x._to_proto())
-            elif isinstance(x, _ResultStream):
-                res.append(x._to_proto())
+        stack = [(iter(array), res, None)]
+        while stack:
+            items, out, stream = stack[-1]
+            for x in items:
+                if isinstance(x, str):
+                    out.append(x)
+                elif isinstance(x, list):
+                    nested: CommandsType = []
+                    out.append(nested)
+                    stack.append((iter(x), nested, None))
+                    break
+                elif isinstance(x, _ResultSource):
+                    out.append(x._to_proto())
+                elif isinstance(x, _ResultStream):
+                    if x._proto is not None:
+                        out.append(x._proto)
+                        continue
+                    nested = []
+                    out.append(nested)
+                    stack.append((iter(x._operator_array), nested, x))
+                    break
+            else:
+                stack.pop()
+                if stream is not None:
+                    stream._proto = out
         return res
 
     def _to_proto(self) -> CommandsType:
-        res = self._array_to_proto(self._operator_array)
-        return res
+        if self._proto is None:
+            self._proto = self._array_to_proto(self._operator_array)
+        return self._proto
 
     def add(self, other: Union["_ResultStream", OneOrMore[PyNumberType]]) -> "_ResultStream":
         """Allows addition between streams. The addition is done element-wise.
@@ -3165,30 +3354,34 @@ class _ResultStream:
     def __add__(self, other: Union["_ResultStream", OneOrMore[PyNumberType]]) -> "_ResultStream":
         if isinstance(other, _ResultStream):
             return _ResultStream(["+", self, other], None)
-        elif isinstance(other, (int, float, np.integer, np.floating)) and not isinstance(other, (bool, np.bool_)):
+        elif _is_scalar(other):
             return _ResultStream(["+", self, str(other)], None)
-        elif hasattr(other, "__len__"):
-            return _ResultStream(["+", self, ["@array"] + [str(item) for item in list(other)]], None)
+        elif _is_vector(other):
+            return _ResultStream(["+", self, _array_to_command(other)], None)
+        return NotImplemented
 
     def __radd__(self, other: OneOrMore[PyNumberType]) -> "_ResultStream":
-        if isinstance(other, (int, float, np.integer, np.floating)) and not isinstance(other, (bool, np.bool_)):
+        if _is_scalar(other):
             return _ResultStream(["+", str(other), self], None)
-        elif hasattr(other, "__len__"):
-            return _ResultStream(["+", ["@array"] + [str(item) for item in list(other)], self], None)
+        elif _is_vector(other):
+            return _ResultStream(["+", _array_to_command(other), self], None)
+        return NotImplemented
 
     def __sub__(self, other: Union["_ResultStream", OneOrMore[PyNumberType]]) -> "_ResultStream":
         if isinstance(other, _ResultStream):
             return _ResultStream(["-", self, other], None)
-        elif isinstance(other, (int, float, np.integer, np.floating)) and not isinstance(other, (bool, np.bool_)):
+        elif _is_scalar(other):
             return _ResultStream(["-", self, str(other)], None)
-        elif hasattr(other, "__len__"):
-            return _ResultStream(["-", self, ["@array"] + [str(item) for item in list(other)]], None)
+        elif _is_vector(other):
+            return _ResultStream(["-", self, _array_to_command(other)], None)
+        return NotImplemented
 
     def __rsub__(self, other: Union["_ResultStream", OneOrMore[PyNumberType]]) -> "_ResultStream":
-        if isinstance(other, (int, float, np.integer, np.floating)) and not isinstance(other, (bool, np.bool_)):
+        if _is_scalar(other):
             return _ResultStream(["-", str(other), self], None)
-        elif hasattr(other, "__len__"):
-            return _ResultStream(["-", ["@array"] + [str(item) for item in list(other)], self], None)
+        elif _is_vector(other):
+            return _ResultStream(["-", _array_to_command(other), self], None)
+        return NotImplemented
 
     def __gt__(self, _):
         raise QmQuaException("Can't use > operator on results")
@@ -3208,16 +3401,18 @@ class _ResultStream:
     def __mul__(self, other: Union["_ResultStream", OneOrMore[PyNumberType]]) -> "_ResultStream":
         if isinstance(other, _ResultStream):
             return _ResultStream(["*", self, other], None)
-        elif isinstance(other, (int, float, np.integer, np.floating)) and not isinstance(other, (bool, np.bool_)):
+        elif _is_scalar(other):
             return _ResultStream(["*", self, str(other)], None)
-        elif hasattr(other, "__len__"):
-            return _ResultStream(["*", self, ["@array"] + [str(item) for item in list(other)]], None)
+        elif _is_vector(other):
+            return _ResultStream(["*", self, _array_to_command(other)], None)
+        return NotImplemented
 
     def __rmul__(self, other: Union["_ResultStream", OneOrMore[PyNumberType]]) -> "_ResultStream":
-        if isinstance(other, (int, float, np.integer, np.floating)) and not isinstance(other, (bool, np.bool_)):
+        if _is_scalar(other):
             return _ResultStream(["*", str(other), self], None)
-        elif hasattr(other, "__len__"):
-            return _ResultStream(["*", ["@array"] + [str(item) for item in list(other)], self], None)
+        elif _is_vector(other):
+            return _ResultStream(["*", _array_to_command(other), self], None)
+        return NotImplemented
 
     def __div__(self, _):
         raise QmQuaException("Can't use / operator on results")
@@ -3225,16 +3420,18 @@ class _ResultStream:
     def __truediv__(self, other: Union["_ResultStream", OneOrMore[PyNumberType]]) -> "_ResultStream":
         if isinstance(other, _ResultStream):
             return _ResultStream(["/", self, other], None)
-        elif isinstance(other, (int, float, np.integer, np.floating)) and not isinstance(other, (bool, np.bool_)):
+        elif _is_scalar(other):
             return _ResultStream(["/", self, str(other)], None)
-        elif hasattr(other, "__len__"):
-            return _ResultStream(["/", self, ["@array"] + [str(item) for item in list(other)]], None)
+        elif _is_vector(other):
+            return _ResultStream(["/", self, _array_to_command(other)], None)
+        return NotImplemented
 
     def __rtruediv__(self, other: Union["_ResultStream", OneOrMore[PyNumberType]]) -> "_ResultStream":
-        if isinstance(other, (int, float, np.integer, np.floating)) and not isinstance(other, (bool, np.bool_)):
+        if _is_scalar(other):
             return _ResultStream(["/", str(other), self], None)
-        elif hasattr(other, "__len__"):
-            return _ResultStream(["/", ["@array"] + [str(item) for item in list(other)], self], None)
+        elif _is_vector(other):
+            return _ResultStream(["/", _array_to_command(other), self], None)
+        return NotImplemented
 
     def __lshift__(self, other: Union["_ResultStream", OneOrMore[PyNumberType]]):
         save(other, self)
@@ -3258,8 +3455,11 @@ class _ResultSourceTimestampMode(Enum):
     ValuesAndTimestamps = 2
 
 
-@dataclass
+@dataclass(frozen=True)
 class _ResultSourceConfiguration:
+    # declared by hand, as dataclass(slots=True) needs python 3.10
+    __slots__ = ("var_name", "timestamp_mode", "is_adc_trace", "input", "auto_reshape")
+
     var_name: str
     timestamp_mode: _ResultSourceTimestampMode
     is_adc_trace: bool
@@ -3275,48 +3475,76 @@ class _ResultSource(_ResultStream):
     See the base class [_ResultStream][qm.qua._dsl._ResultStream] for operations
     """
 
+    __slots__ = ("_configuration",)
+
     def __init__(self, configuration: _ResultSourceConfiguration):
         super().__init__(None, None)
         self._configuration = configuration
 
     def _to_proto(self) -> List[str]:
-        result = [
-            _RESULT_SYMBOL,
-            str(self._configuration.timestamp_mode.value),
-            self._configuration.var_name,
-        ]
-        inputs = ["@macro_input", str(self._configuration.input), result] if self._configuration.input != -1 else result
-        auto_reshape = ["@macro_auto_reshape", inputs] if self._configuration.auto_reshape else inputs
-        return ["@macro_adc_trace", auto_reshape] if self._configuration.is_adc_trace else auto_reshape
+        # the configuration is frozen and only ever replaced by the methods below, never changed, so this is built once
+        if self._proto is None:
+            configuration = self._configuration
+            result = [_RESULT_SYMBOL, str(configuration.timestamp_mode.value), configuration.var_name]
+            inputs = ["@macro_input", str(configuration.input), result] if configuration.input != -1 else result
+            auto_reshape = ["@macro_auto_reshape", inputs] if configuration.auto_reshape else inputs
+            self._proto = ["@macro_adc_trace", auto_reshape] if configuration.is_adc_trace else auto_reshape
+        return self._proto
 
     def get_var_name(self) -> str:
         return self._configuration.var_name
 
     def with_timestamps(self) -> _ResultStream:
         """Get a stream with the relevant timestamp for each stream-item"""
+        c = self._configuration
         return _ResultSource(
-            dataclasses.replace(
-                self._configuration,
+            _ResultSourceConfiguration(
+                var_name=c.var_name,
                 timestamp_mode=_ResultSourceTimestampMode.ValuesAndTimestamps,
+                is_adc_trace=c.is_adc_trace,
+                input=c.input,
+                auto_reshape=c.auto_reshape,
             )
         )
 
     def timestamps(self) -> _ResultStream:
         """Get a stream with only the timestamps of the stream-items"""
+        c = self._configuration
         return _ResultSource(
-            dataclasses.replace(
-                self._configuration,
+            _ResultSourceConfiguration(
+                var_name=c.var_name,
                 timestamp_mode=_ResultSourceTimestampMode.Timestamps,
+                is_adc_trace=c.is_adc_trace,
+                input=c.input,
+                auto_reshape=c.auto_reshape,
             )
         )
 
     def input1(self) -> "_ResultSource":
         """A stream of raw ADC data from input 1. Only relevant when saving data from measure statement."""
-        return _ResultSource(dataclasses.replace(self._configuration, input=1))
+        c = self._configuration
+        return _ResultSource(
+            _ResultSourceConfiguration(
+                var_name=c.var_name,
+                timestamp_mode=c.timestamp_mode,
+                is_adc_trace=c.is_adc_trace,
+                input=1,
+                auto_reshape=c.auto_reshape,
+            )
+        )
 
     def input2(self) -> "_ResultSource":
         """A stream of raw ADC data from input 2. Only relevant when saving data from measure statement."""
-        return _ResultSource(dataclasses.replace(self._configuration, input=2))
+        c = self._configuration
+        return _ResultSource(
+            _ResultSourceConfiguration(
+                var_name=c.var_name,
+                timestamp_mode=c.timestamp_mode,
+                is_adc_trace=c.is_adc_trace,
+                input=2,
+                auto_reshape=c.auto_reshape,
+            )
+        )
 
     def auto_reshape(self) -> "_ResultSource":
         """Creates a buffer with dimensions according to the program structure in QUA.
@@ -3337,7 +3565,16 @@ class _ResultSource(_ResultStream):
                 stream.auto_reshape().save_all("reshaped")
             ```
         """
-        return _ResultSource(dataclasses.replace(self._configuration, auto_reshape=True))
+        c = self._configuration
+        return _ResultSource(
+            _ResultSourceConfiguration(
+                var_name=c.var_name,
+                timestamp_mode=c.timestamp_mode,
+                is_adc_trace=c.is_adc_trace,
+                input=c.input,
+                auto_reshape=True,
+            )
+        )
 
 
 def bins(start: PyNumberType, end: PyNumberType, number_of_bins: PyFloatType):
@@ -3347,6 +3584,6 @@ def bins(start: PyNumberType, end: PyNumberType, number_of_bins: PyFloatType):
         step_end = start + bin_size - 1
         if step_end >= end:
             step_end = end
-        binsList = binsList + [[start, step_end]]
+        binsList.append([start, step_end])
         start += bin_size
     return binsList
@@ -2,16 +2,47 @@ import random
 from functools import wraps
 from collections.abc import Iterable
 
-import qm.program.expressions as _exp
-from qm.qua._dsl import assign, declare, _Expression, _to_expression
+from qm.program.expressions import lib_func as _lib_func
 from qm.utils import get_iterable_elements_datatype as _get_iterable_elements_datatype
+from qm.qua._dsl import assign, declare, _Variable, _Expression, _to_expression, _get_root_program_scope
+
+# Math, Cast, Util and Random only build the QUA expressions calling the library functions; the computation itself runs
+# on the hardware. There is no numeric work here for a JIT (numba, cython) to speed up, the cost is in building messages.
 
 
 def _library_function(lib_name, func_name):
+    """Turns a function returning its arguments, in order, into a call to ``func_name`` of the QUA library ``lib_name``.
+
+    The decorated function is only called to bind keyword arguments or to reject a wrong number of arguments; a call
+    passing exactly its positional arguments is forwarded as is.
+    """
+
     def library_decorator(function):
+        arity = function.__code__.co_argcount
+
         @wraps(function)
         def wrapper(*args, **kwargs):
-            new_args = function(*args, **kwargs)
+            if kwargs or len(args) != arity:
+                args = function(*args, **kwargs)
+            return call_library_function(lib_name, func_name, args)
+
+        return wrapper
+
+    return library_decorator
+
+
+def _library_method(lib_name, func_name):
+    """Like ``_library_function``, for methods of ``Random`` whose library call takes the seed before the arguments"""
+
+    def library_decorator(function):
+        arity = function.__code__.co_argcount - 1
+
+        @wraps(function)
+        def wrapper(self, *args, **kwargs):
+            if kwargs or len(args) != arity:
+                new_args = function(self, *args, **kwargs)
+            else:
+                new_args = (self._seed, *args)
             return call_library_function(lib_name, func_name, new_args)
 
         return wrapper
@@ -19,14 +50,44 @@ def _library_function(lib_name, func_name):
     return library_decorator
 
 
+# Exact types of the arguments that are passed on as they are, checked before the (slower) abstract Iterable check
+_PLAIN_ARG_TYPES = frozenset((int, float, bool, _Expression, _Variable))
+
+
 def _sanitize_arg(arg):
+    if type(arg) in _PLAIN_ARG_TYPES:
+        return arg
     if isinstance(arg, Iterable):
-        return declare(_get_iterable_elements_datatype(arg), value=arg)
+        return _declare_library_array(arg)
     return arg
 
 
+def _declare_library_array(values):
+    # Nothing can assign to the arrays declared for python values (e.g. the coefficients of Math.dot), so the same
+    # values passed again in the program reuse the array declared the first time. Values are keyed with their type, as
+    # 1, 1.0 and True are equal but declare different arrays.
+    t = _get_iterable_elements_datatype(values)
+    try:
+        key = tuple((type(value), value) for value in values)
+        hash(key)
+    except TypeError:
+        return declare(t, value=values)
+    declared_arrays = _get_root_program_scope().declared_library_arrays
+    array = declared_arrays.get(key)
+    if array is None:
+        array = declared_arrays[key] = declare(t, value=values)
+    return array
+
+
+def _to_library_argument(arg):
+    # QUA expressions and variables (e.g. the result of another library call) are unwrapped directly
+    if type(arg) is _Expression or type(arg) is _Variable:
+        return arg._expression
+    return _to_expression(_sanitize_arg(arg))
+
+
 def call_library_function(lib_name, func_name, args):
-    return _Expression(_exp.lib_func(lib_name, func_name, *[_to_expression(_sanitize_arg(x)) for x in args]))
+    return _Expression(_lib_func(lib_name, func_name, *[_to_library_argument(x) for x in args]))
 
 
 class Math:
@@ -599,7 +660,7 @@ class Random:
         """
         assign(self._seed, exp)
 
-    @_library_function("random", "rand_int")
+    @_library_method("random", "rand_int")
     def rand_int(self, max_int):
         r"""Returns a pseudorandom integer in range [0, max_int)
 
@@ -614,7 +675,7 @@ class Random:
         """
         return self._seed, max_int
 
-    @_library_function("random", "rand_fixed")
+    @_library_method("random", "rand_fixed")
     def rand_fixed(self):
         r"""Returns a pseudorandom fixed in range [0.0, 1.0)
 
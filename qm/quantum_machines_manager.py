@@ -7,6 +7,7 @@ from typing import Any, Dict, List, Optional
 
 import marshmallow
 
+from qm.version import __version__
 from qm.octave import QmOctaveConfig
 from qm._controller import Controller
 from qm.user_config import UserConfig
@@ -154,13 +155,12 @@ class QuantumMachinesManager:
         Returns:
             A dictionary with the qm-qua and QOP versions
         """
-        from qm.version import __version__
-
         output_dict: Version = {}
         server_version = self._server_details.server_version
         output_dict["qm-qua"] = __version__
-        if server_version in SERVER_TO_QOP_VERSION_MAP:
-            output_dict["QOP"] = SERVER_TO_QOP_VERSION_MAP[server_version]
+        qop_version = SERVER_TO_QOP_VERSION_MAP.get(server_version)
+        if qop_version is not None:
+            output_dict["QOP"] = qop_version
         else:
             output_dict["OPX"] = server_version
         if is_debug():
@@ -207,7 +207,7 @@ class QuantumMachinesManager:
         self,
         config: DictQuaConfig,
         close_other_machines: bool = True,
-        validate_with_protobuf: bool = False,
+        validate_with_protobuf: bool = True,
         add_calibration_elements_to_config: bool = True,
         use_calibration_data: bool = True,
         **kwargs: Any,
@@ -224,7 +224,8 @@ class QuantumMachinesManager:
                 quantum machine.
             validate_with_protobuf (bool): Validates config with
                 protobuf instead of marshmallow. It is usually faster
-                when working with large configs. Defaults to False.
+                when working with large configs. Defaults to True, set
+                to False to validate with marshmallow.
 
         Returns:
             A quantum machine obj that can be used to execute programs
@@ -1,8 +1,11 @@
 import abc
 import json
+import pickle
 import logging
+import operator
 import warnings
 from io import BytesIO
+from functools import lru_cache
 from dataclasses import dataclass
 from typing_extensions import Protocol
 from typing import Any, Dict, List, Tuple, Union, BinaryIO, Optional, cast
@@ -32,15 +35,23 @@ class JobStreamingStateProtocol(Protocol):
     has_dataloss: bool
 
 
-def _parse_dtype(simple_dtype: str) -> DtypeType:
-    def hinted_tuple_hook(obj: Any) -> Any:
-        if "__tuple__" in obj:
-            return tuple(obj["items"])
-        else:
-            return obj
+def _hinted_tuple_hook(obj: Any) -> Any:
+    if "__tuple__" in obj:
+        return tuple(obj["items"])
+    else:
+        return obj
 
-    dtype = json.loads(simple_dtype, object_hook=hinted_tuple_hook)
-    return cast(DtypeType, dtype)
+
+@lru_cache(maxsize=256)
+def _load_dtype(simple_dtype: str) -> bytes:
+    return pickle.dumps(json.loads(simple_dtype, object_hook=_hinted_tuple_hook))
+
+
+def _parse_dtype(simple_dtype: str) -> DtypeType:
+    # The same header is fetched over and over while waiting for values, so each dtype string is parsed once. The cache
+    # holds an immutable pickled snapshot: fields may contain lists (e.g. sub-array shapes), so every call unpickles a
+    # complete new copy, which no caller can use to change what later calls get. Unpickling is much faster than parsing.
+    return cast(DtypeType, pickle.loads(_load_dtype(simple_dtype)))
 
 
 @dataclass
@@ -212,13 +223,17 @@ class BaseStreamingResultFetcher(metaclass=abc.ABCMeta):
                 stacklevel=2,
             )
 
+        last_state: Optional[JobStreamingState] = None
+
         def on_iteration() -> bool:
-            header = self.get_job_state()
-            return header.done or header.closed
+            nonlocal last_state
+            last_state = self.get_job_state()
+            return last_state.done or last_state.closed
 
         def on_finish() -> bool:
-            header = self.get_job_state()
-            return header.done
+            # the state that ended the loop is already known, no need to ask the server again
+            assert last_state is not None
+            return last_state.done
 
         return run_until_with_timeout(
             on_iteration_callback=on_iteration,
@@ -365,16 +380,20 @@ class BaseStreamingResultFetcher(metaclass=abc.ABCMeta):
                                  # same as res.fetch_all()[1:6]
             ```
         """
-        if type(item) is int:
-            start = item
-            stop = item + 1
-            step = None
-        elif type(item) is slice:
+        if isinstance(item, slice):
             start = item.start
             stop = item.stop
             step = item.step
         else:
-            raise Exception("fetch supports only int or slice")
+            # any integer type is accepted as an index, including numpy integers, but not booleans
+            if isinstance(item, (bool, numpy.bool_)):
+                raise Exception("fetch supports only int or slice")
+            try:
+                start = operator.index(item)
+            except TypeError:
+                raise Exception("fetch supports only int or slice") from None
+            stop = start + 1
+            step = None
 
         if step != 1 and step is not None:
             raise Exception("fetch supports step=1 or None in slices")
@@ -386,30 +405,28 @@ class BaseStreamingResultFetcher(metaclass=abc.ABCMeta):
         if start is None:
             start = 0
 
-        writer = self._fetch_all_job_results(header, start, stop)
+        result = self._fetch_all_job_results(header, start, stop)
 
         if header.has_dataloss:
             logger.warning(f"Possible data loss detected in data for job: {self._job_id}")
 
-        return cast(numpy.typing.NDArray[numpy.generic], numpy.load(writer))  # type: ignore[no-untyped-call]
+        return result
 
-    def _fetch_all_job_results(self, header: NamedJobResultHeader, start: int, stop: int) -> BinaryIO:
+    def _fetch_all_job_results(
+        self, header: NamedJobResultHeader, start: int, stop: int
+    ) -> numpy.typing.NDArray[numpy.generic]:
         self._count_data_written = 0
-        writer = BytesIO()
         data_writer = BytesIO()
 
         run_async(self._add_results_to_writer(data_writer, start, stop))
 
         final_shape = self._get_final_shape(self._count_data_written, header.shape)
 
-        self._write_header(writer, final_shape, header.d_type)
-
-        data_writer.seek(0)
-        for d in data_writer:
-            writer.write(d)
-
-        writer.seek(0)
-        return writer
+        # The dtype and shape are already known from the header, so the array is built directly on the fetched data
+        # instead of writing an npy header in front of it and having numpy.load parse it back. The dtype is built the
+        # same way numpy.load builds it from that header.
+        dtype = _format.descr_to_dtype(header.d_type)  # type: ignore[no-untyped-call]
+        return numpy.frombuffer(data_writer.getbuffer(), dtype=dtype).reshape(final_shape)
 
     @staticmethod
     def _get_final_shape(count: int, shape: Tuple[int, ...]) -> Tuple[int, ...]:
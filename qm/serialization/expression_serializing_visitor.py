@@ -1,3 +1,5 @@
+from typing import Dict, Optional
+
 import betterproto
 
 from qm.grpc import qua
@@ -6,8 +8,11 @@ from qm.serialization.qua_node_visitor import QuaNodeVisitor
 
 
 class ExpressionSerializingVisitor(QuaNodeVisitor):
-    def __init__(self) -> None:
+    def __init__(self, cache: Optional[Dict[int, str]] = None) -> None:
         self._out = ""
+        # shared by all nested visitors of one top-level serialize call, so subtrees that are
+        # referenced more than once (e.g. shared literals) are only serialized once
+        self._cache = {} if cache is None else cache
         super().__init__()
 
     def _default_visit(self, node):
@@ -17,7 +22,7 @@ class ExpressionSerializingVisitor(QuaNodeVisitor):
 
     def visit_qm_grpc_qua_QuaProgramLibFunctionExpression(self, node: qua.QuaProgramLibFunctionExpression):
         if node.library_name == "random":
-            args = [ExpressionSerializingVisitor.serialize(arg) for arg in node.arguments]
+            args = [self._serialize(arg) for arg in node.arguments]
             self._out = f"call_library_function('{node.library_name}', '{node.function_name}', [{','.join(args)}])"
         else:
             library_name = {
@@ -70,7 +75,7 @@ class ExpressionSerializingVisitor(QuaNodeVisitor):
             if function_name is None:
                 raise Exception(f"Unsupported function name {node.function_name}")
 
-            args = [ExpressionSerializingVisitor.serialize(arg) for arg in node.arguments]
+            args = [self._serialize(arg) for arg in node.arguments]
 
             self._out = f"{library_name}.{function_name}({','.join(args)})"
 
@@ -79,7 +84,7 @@ class ExpressionSerializingVisitor(QuaNodeVisitor):
     ):
         name, value = betterproto.which_one_of(node, "argument_oneof")
         if value is not None and name in ("scalar", "array"):
-            self._out = ExpressionSerializingVisitor.serialize(value)
+            self._out = self._serialize(value)
         else:
             raise QmQuaException(f"Unknown library function argument {name}")
 
@@ -90,8 +95,8 @@ class ExpressionSerializingVisitor(QuaNodeVisitor):
         self._out = node.name
 
     def visit_qm_grpc_qua_QuaProgramArrayCellRefExpression(self, node):
-        var = ExpressionSerializingVisitor.serialize(node.array_var)
-        index = ExpressionSerializingVisitor.serialize(node.index)
+        var = self._serialize(node.array_var)
+        index = self._serialize(node.index)
         self._out = f"{var}[{index}]"
 
     def visit_qm_grpc_qua_QuaProgramArrayLengthExpression(self, node):
@@ -120,11 +125,11 @@ class ExpressionSerializingVisitor(QuaNodeVisitor):
         target_name, target_value = betterproto.which_one_of(node.target, "processTarget")
 
         if target_name == "scalar_process":
-            target = ExpressionSerializingVisitor.serialize(target_value)
+            target = self._serialize(target_value)
             self._out = f'demod.full("{name}", {target}, "{output}")'
         elif target_name == "vector_process":
             target_value: qua.QuaProgramAnalogProcessTargetVectorProcessTarget
-            target = ExpressionSerializingVisitor.serialize(target_value.array)
+            target = self._serialize(target_value.array)
 
             time_name, time_value = betterproto.which_one_of(target_value.time_division, "timeDivision")
             if time_name == "sliced":
@@ -144,10 +149,10 @@ class ExpressionSerializingVisitor(QuaNodeVisitor):
         target_name, target_value = betterproto.which_one_of(node.target, "processTarget")
 
         if target_name == "scalar_process":
-            target = ExpressionSerializingVisitor.serialize(target_value)
+            target = self._serialize(target_value)
             self._out = f'integration.full("{name}", {target}, "{output}")'
         elif target_name == "vector_process":
-            target = ExpressionSerializingVisitor.serialize(target_value.array)
+            target = self._serialize(target_value.array)
 
             time_name, time_value = betterproto.which_one_of(target_value.time_division, "timeDivision")
             if time_name == "sliced":
@@ -171,10 +176,10 @@ class ExpressionSerializingVisitor(QuaNodeVisitor):
         target_name, target_value = betterproto.which_one_of(node.target, "processTarget")
 
         if target_name == "scalar_process":
-            target = ExpressionSerializingVisitor.serialize(target_value)
+            target = self._serialize(target_value)
             self._out = f'dual_demod.full("{name1}", "{output1}", "{name2}", "{output2}", {target})'
         elif target_name == "vector_process":
-            target = ExpressionSerializingVisitor.serialize(target_value.array)
+            target = self._serialize(target_value.array)
 
             time_name, time_value = betterproto.which_one_of(target_value.time_division, "timeDivision")
             if time_name == "sliced":
@@ -196,10 +201,10 @@ class ExpressionSerializingVisitor(QuaNodeVisitor):
         target_name, target_value = betterproto.which_one_of(node.target, "processTarget")
 
         if target_name == "scalar_process":
-            target = ExpressionSerializingVisitor.serialize(target_value)
+            target = self._serialize(target_value)
             self._out = f'dual_integration.full("{name1}", "{output1}", "{name2}", "{output2}", {target})'
         elif target_name == "vector_process":
-            target = ExpressionSerializingVisitor.serialize(target_value.array)
+            target = self._serialize(target_value.array)
 
             time_name, time_value = betterproto.which_one_of(target_value.time_division, "timeDivision")
             if time_name == "sliced":
@@ -216,15 +221,15 @@ class ExpressionSerializingVisitor(QuaNodeVisitor):
     def visit_qm_grpc_qua_QuaProgramAnalogMeasureProcessRawTimeTagging(
         self, node: qua.QuaProgramAnalogMeasureProcessRawTimeTagging
     ):
-        target = ExpressionSerializingVisitor.serialize(node.target)
-        target_len = ExpressionSerializingVisitor.serialize(node.target_len)
+        target = self._serialize(node.target)
+        target_len = self._serialize(node.target_len)
         max_time = node.max_time
         element_output = node.element_output
         self._out = f'time_tagging.analog({target}, {max_time}, {target_len}, "{element_output}")'
 
     def visit_qm_grpc_qua_QuaProgramAnalogMeasureProcessHighResTimeTagging(self, node):
-        target = ExpressionSerializingVisitor.serialize(node.target)
-        target_len = ExpressionSerializingVisitor.serialize(node.target_len)
+        target = self._serialize(node.target)
+        target_len = self._serialize(node.target_len)
         max_time = node.max_time
         element_output = node.element_output
         self._out = f'time_tagging.high_res({target}, {max_time}, {target_len}, "{element_output}")'
@@ -237,13 +242,13 @@ class ExpressionSerializingVisitor(QuaNodeVisitor):
         for element_output in node.element_outputs:
             element_outputs.append(f'"{element_output}"')
         element_outputs_str = ",".join(element_outputs)
-        target = ExpressionSerializingVisitor.serialize(node.target)
+        target = self._serialize(node.target)
         max_time = node.max_time
         self._out = f"counting.digital({target}, {max_time}, ({element_outputs_str}))"
 
     def visit_qm_grpc_qua_QuaProgramDigitalMeasureProcessRawTimeTagging(self, node):
-        target = ExpressionSerializingVisitor.serialize(node.target)
-        target_len = ExpressionSerializingVisitor.serialize(node.target_len)
+        target = self._serialize(node.target)
+        target_len = self._serialize(node.target_len)
         max_time = node.max_time
         element_output = node.element_output
         self._out = f'time_tagging.digital({target}, {max_time}, {target_len}, "{element_output}")'
@@ -261,8 +266,8 @@ class ExpressionSerializingVisitor(QuaNodeVisitor):
         super()._default_visit(node)
 
     def visit_qm_grpc_qua_QuaProgramBinaryExpression(self, node):
-        left = ExpressionSerializingVisitor.serialize(node.left)
-        right = ExpressionSerializingVisitor.serialize(node.right)
+        left = self._serialize(node.left)
+        right = self._serialize(node.right)
         sop = node.op
         mapping = {
             qua.QuaProgramBinaryExpressionBinaryOperator.ADD: "+",
@@ -288,6 +293,12 @@ class ExpressionSerializingVisitor(QuaNodeVisitor):
 
     @staticmethod
     def serialize(node) -> str:
-        visitor = ExpressionSerializingVisitor()
-        visitor.visit(node)
-        return visitor._out
+        return ExpressionSerializingVisitor()._serialize(node)
+
+    def _serialize(self, node) -> str:
+        key = id(node)
+        if key not in self._cache:
+            visitor = ExpressionSerializingVisitor(self._cache)
+            visitor.visit(node)
+            self._cache[key] = visitor._out
+        return self._cache[key]
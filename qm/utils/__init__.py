@@ -5,6 +5,7 @@ from qm.utils.types_utils import (
     is_iter,
     collection_has_type,
     collection_has_type_int,
+    collection_number_types,
     collection_has_type_bool,
     collection_has_type_float,
     get_all_iterable_data_types,
@@ -18,6 +19,7 @@ __all__ = [
     "collection_has_type_bool",
     "collection_has_type_int",
     "collection_has_type_float",
+    "collection_number_types",
     "is_iter",
     "get_iterable_elements_datatype",
     "deprecate_to_property",
@@ -3,6 +3,7 @@ from typing import (
     Any,
     Set,
     Type,
+    Tuple,
     Union,
     TypeVar,
     Iterable,
@@ -64,6 +65,40 @@ def collection_has_type_float(collection: Collection[C]) -> bool:
     return collection_has_type(collection, float, False) or collection_has_type(collection, np.floating, True)
 
 
+def collection_number_types(collection: Collection[Any]) -> Tuple[bool, bool, bool]:
+    """Checks in a single pass which of bool, int and float the collection contains.
+
+    Python and numpy scalars are both accepted, with the same rules as collection_has_type_bool,
+    collection_has_type_int and collection_has_type_float.
+
+    Returns:
+        A (has_bool, has_int, has_float) tuple
+    """
+    if isinstance(collection, np.ndarray) and collection.size > 0:
+        kind = collection.dtype.kind
+        if kind == "b":
+            return True, False, False
+        if kind in "iu":
+            return False, True, False
+        if kind == "f":
+            return False, False, True
+
+    has_bool = has_int = has_float = False
+    for item in collection:
+        item_type = type(item)
+        if item_type is bool or isinstance(item, np.bool_):
+            has_bool = True
+        elif item_type is int or isinstance(item, np.integer):
+            has_int = True
+        elif item_type is float or isinstance(item, np.floating):
+            has_float = True
+        else:
+            continue
+        if has_bool and has_int and has_float:
+            break
+    return has_bool, has_int, has_float
+
+
 def is_iter(x: Any) -> bool:
     try:
         iter(x)
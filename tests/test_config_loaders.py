@@ -0,0 +1,109 @@
+import copy
+import uuid
+
+import pytest
+
+from qm.program import load_config
+from qm.program._qua_config_to_pb import load_config_pb
+from qm.containers.capabilities_container import create_capabilities_container
+
+
+@pytest.fixture(autouse=True)
+def capabilities():
+    create_capabilities_container(None)
+
+
+@pytest.fixture
+def fixed_uuid(monkeypatch):
+    # Mixers generated for octave elements get a random suffix
+    monkeypatch.setattr(uuid, "uuid4", lambda: uuid.UUID(int=0))
+
+
+def _config():
+    return {
+        "version": 1,
+        "controllers": {
+            "con1": {
+                "analog_outputs": {i: {"offset": 0.0} for i in range(1, 11)},
+                "digital_outputs": {1: {}},
+                "analog_inputs": {1: {"offset": 0.0}, 2: {"offset": 0.0, "gain_db": 3}},
+            }
+        },
+        "elements": {
+            "qubit": {
+                "singleInput": {"port": ("con1", 1)},
+                "intermediate_frequency": 50e6,
+                "operations": {"cw": "const"},
+            },
+            "resonator": {
+                "mixInputs": {"I": ("con1", 2), "Q": ("con1", 3), "lo_frequency": 6e9, "mixer": "mixer"},
+                "intermediate_frequency": 50e6,
+                "outputs": {"out1": ("con1", 1)},
+                "time_of_flight": 24,
+                "smearing": 0,
+                "digitalInputs": {"switch": {"port": ("con1", 1), "delay": 0, "buffer": 0}},
+                "operations": {"readout": "readout"},
+            },
+        },
+        "pulses": {
+            "const": {"operation": "control", "length": 100, "waveforms": {"single": "const"}},
+            "readout": {
+                "operation": "measurement",
+                "length": 100,
+                "waveforms": {"I": "const", "Q": "zero"},
+                "digital_marker": "ON",
+                "integration_weights": {"cos": "cos"},
+            },
+        },
+        "waveforms": {
+            "const": {"type": "constant", "sample": 0.2},
+            "zero": {"type": "constant", "sample": 0.0},
+            "arbitrary": {"type": "arbitrary", "samples": [0.1] * 16},
+        },
+        "digital_waveforms": {"ON": {"samples": [(1, 0)]}},
+        "integration_weights": {"cos": {"cosine": [(1.0, 100)], "sine": [(0.0, 100)]}},
+        "mixers": {"mixer": [{"intermediate_frequency": 50e6, "lo_frequency": 6e9, "correction": (1, 0, 0, 1)}]},
+    }
+
+
+def _without_gain():
+    config = _config()
+    del config["controllers"]["con1"]["analog_inputs"][2]["gain_db"]
+    return config
+
+
+def _with_zero_gain():
+    config = _config()
+    config["controllers"]["con1"]["analog_inputs"][1]["gain_db"] = 0
+    return config
+
+
+def _with_octave():
+    config = _config()
+    config["octaves"] = {
+        "oct1": {
+            "RF_outputs": {1: {"LO_frequency": 6e9, "LO_source": "internal", "output_mode": "always_on", "gain": 0}},
+            "RF_inputs": {1: {"LO_frequency": 6e9, "LO_source": "internal"}},
+            "connectivity": "con1",
+        }
+    }
+    config["elements"]["octave_qubit"] = {
+        "RF_inputs": {"port": ("oct1", 1)},
+        "RF_outputs": {"port": ("oct1", 1)},
+        "intermediate_frequency": 50e6,
+        "time_of_flight": 24,
+        "smearing": 0,
+        "operations": {"cw": "const"},
+    }
+    return config
+
+
+@pytest.mark.parametrize("make_config", [_config, _without_gain, _with_zero_gain, _with_octave])
+def test_loaders_agree(make_config, fixed_uuid):
+    config = make_config()
+    assert load_config_pb(copy.deepcopy(config)).to_dict() == load_config(copy.deepcopy(config)).to_dict()
+
+
+def test_gain_db_is_unset_when_absent():
+    pb_config = load_config_pb(_without_gain())
+    assert pb_config.v1_beta.controllers["con1"].analog_inputs[2].gain_db is None
@@ -0,0 +1,32 @@
+from qm.qua import assign, declare, program, infinite_loop_
+
+
+def _assigned_expression(prog, index):
+    return prog._program.script.body.statements[index].assign.expression
+
+
+def test_negation_literal_has_loc():
+    with program() as prog:
+        a = declare(int)
+        assign(a, -a)
+    literal = _assigned_expression(prog, 0).binary_operation.left.literal
+    assert literal.value == "0"
+    assert "assign(a, -a)" in literal.loc
+
+
+def test_invert_literal_has_loc():
+    with program() as prog:
+        c = declare(bool)
+        assign(c, ~c)
+    literal = _assigned_expression(prog, 0).binary_operation.right.literal
+    assert literal.value == "True"
+    assert "assign(c, ~c)" in literal.loc
+
+
+def test_infinite_loop_condition_has_loc():
+    with program() as prog:
+        with infinite_loop_():
+            pass
+    literal = prog._program.script.body.statements[0].for_.condition.literal
+    assert literal.value == "True"
+    assert "with infinite_loop_():" in literal.loc
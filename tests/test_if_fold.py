@@ -0,0 +1,59 @@
+import pytest
+
+from qm.exceptions import QmQuaException
+from qm.qua import if_, play, elif_, else_, declare, program
+
+
+@pytest.mark.parametrize("value", [True, False])
+@pytest.mark.parametrize("follower", [lambda x: else_(), lambda x: elif_(x < 0)], ids=["else", "elif"])
+def test_elif_else_after_folded_if_raises(value, follower):
+    with program():
+        x = declare(int)
+        with if_(x > 0):
+            play("a", "e")
+        with if_(value, fold=True):
+            play("b", "e")
+        with pytest.raises(QmQuaException):
+            with follower(x):
+                play("c", "e")
+
+
+@pytest.mark.parametrize("value", [True, False])
+def test_else_after_folded_if_with_inner_if_raises(value):
+    with program():
+        x = declare(int)
+        with if_(value, fold=True):
+            with if_(x > 0):
+                play("a", "e")
+        with pytest.raises(QmQuaException):
+            with else_():
+                play("c", "e")
+
+
+def test_folded_if_true_inlines_body():
+    with program() as prog:
+        with if_(True, fold=True):
+            play("a", "e")
+    statements = prog._program.script.body.statements
+    assert len(statements) == 1
+    assert statements[0].play.qe.name == "e"
+
+
+def test_folded_if_false_drops_body():
+    with program() as prog:
+        with if_(False, fold=True):
+            play("a", "e")
+    assert len(prog._program.script.body.statements) == 0
+
+
+def test_else_after_statement_following_folded_if():
+    with program() as prog:
+        x = declare(int)
+        with if_(False, fold=True):
+            play("a", "e")
+        with if_(x > 0):
+            play("b", "e")
+        with else_():
+            play("c", "e")
+    (if_statement,) = prog._program.script.body.statements
+    assert if_statement.if_.else_.statements[0].play.qe.name == "e"
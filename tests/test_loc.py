@@ -0,0 +1,27 @@
+import os
+
+from qm._loc import _get_loc
+
+
+def _run(path):
+    namespace = {"_get_loc": _get_loc}
+    with open(path) as f:
+        exec(compile(f.read(), str(path), "exec"), namespace)
+    return namespace["loc"]
+
+
+def test_loc_reads_edited_source(tmp_path):
+    path = tmp_path / "script.py"
+    path.write_text("loc = _get_loc()  # first\n")
+    assert "# first" in _run(path)
+
+    path.write_text("loc = _get_loc()  # second\n")
+    stat = os.stat(path)
+    os.utime(path, (stat.st_atime, stat.st_mtime + 10))
+    assert "# second" in _run(path)
+
+
+def test_loc_points_at_caller():
+    loc = _get_loc()
+    assert __file__ in loc
+    assert "loc = _get_loc()" in loc
@@ -0,0 +1,38 @@
+import pytest
+import numpy as np
+
+from qm.qua._dsl import _is_scalar, _is_vector
+from qm.qua import program, declare_stream, stream_processing
+
+
+@pytest.mark.parametrize("value", [[1, 2], (1, 2), np.array([1.0, 2.0]), range(3)])
+def test_vectors(value):
+    assert _is_vector(value)
+    assert not _is_scalar(value)
+
+
+@pytest.mark.parametrize("value", ["12", b"12"])
+def test_text_is_not_a_vector(value):
+    assert not _is_vector(value)
+    assert not _is_scalar(value)
+
+
+@pytest.mark.parametrize("value", [1, 2.5, np.int32(3), np.float64(0.5)])
+def test_scalars(value):
+    assert _is_scalar(value)
+    assert not _is_vector(value)
+
+
+@pytest.mark.parametrize("value", [True, np.bool_(False)])
+def test_bools_are_not_scalars(value):
+    assert not _is_scalar(value)
+
+
+def test_stream_arithmetic_with_text_raises():
+    with program():
+        stream = declare_stream()
+        with stream_processing():
+            with pytest.raises(TypeError):
+                stream + "12"
+            with pytest.raises(TypeError):
+                "12" * stream
@@ -0,0 +1,101 @@
+from types import SimpleNamespace
+
+import numpy
+import pytest
+
+from qm.results.base_streaming_result_fetcher import JobResultItemSchema, BaseStreamingResultFetcher, _parse_dtype
+
+SUB_ARRAY_DTYPE = (
+    '[{"__tuple__": true, "items": ["value", "<f8", [3]]}, {"__tuple__": true, "items": ["timestamp", "<i8"]}]'
+)
+
+
+def test_parse_dtype():
+    assert _parse_dtype(SUB_ARRAY_DTYPE) == [("value", "<f8", [3]), ("timestamp", "<i8")]
+
+
+def test_parse_dtype_results_are_independent():
+    first = _parse_dtype(SUB_ARRAY_DTYPE)
+    first[0][2].append(4)
+    first.append(("other", "<i4"))
+    assert _parse_dtype(SUB_ARRAY_DTYPE) == [("value", "<f8", [3]), ("timestamp", "<i8")]
+
+
+class _FakeResultService:
+    def __init__(self, simple_d_type, shape, data):
+        self._simple_d_type = simple_d_type
+        self._shape = shape
+        self._data = data
+
+    def get_named_header(self, job_id, output_name, flat_struct):
+        return SimpleNamespace(
+            count_so_far=len(self._data),
+            is_single=False,
+            simple_d_type=self._simple_d_type,
+            shape=self._shape,
+            has_dataloss=False,
+            has_execution_errors=False,
+        )
+
+    async def get_job_named_result(self, job_id, output_name, long_offset, limit):
+        for item in self._data[long_offset : long_offset + limit]:
+            yield SimpleNamespace(count_of_items=1, data=item.tobytes())
+
+
+class _Fetcher(BaseStreamingResultFetcher):
+    def _validate_schema(self) -> None:
+        pass
+
+
+def _fetcher(simple_d_type, shape, data):
+    service = _FakeResultService(simple_d_type, shape, data)
+    schema = JobResultItemSchema("res", _parse_dtype(simple_d_type), tuple(shape), False, len(data))
+    return _Fetcher(
+        job_id="job",
+        schema=schema,
+        service=service,
+        store=None,
+        stream_metadata_errors=[],
+        stream_metadata=None,
+        capabilities=None,
+    )
+
+
+SCALAR_DTYPE = '[{"__tuple__": true, "items": ["value", "<i8"]}]'
+# newline bytes in the payload must not matter
+SCALAR_DATA = numpy.array([(v,) for v in [1, 10, 0x0A0A, 3, 4]], dtype=[("value", "<i8")])
+SUB_ARRAY_DATA = numpy.array([((i, i + 1, i + 2),) for i in range(4)], dtype=[("value", "<f8", (3,))])
+
+
+def test_strict_fetch_slice():
+    result = _fetcher(SCALAR_DTYPE, [1], SCALAR_DATA).strict_fetch(slice(1, 4))
+    assert result.shape == (3,)
+    assert result.dtype == SCALAR_DATA.dtype
+    assert (result == SCALAR_DATA[1:4]).all()
+    assert result.flags.writeable
+
+
+def test_strict_fetch_all_and_empty():
+    fetcher = _fetcher(SCALAR_DTYPE, [1], SCALAR_DATA)
+    assert (fetcher.strict_fetch(slice(None, None)) == SCALAR_DATA).all()
+    assert fetcher.strict_fetch(slice(2, 2)).shape == (0,)
+
+
+def test_strict_fetch_sub_array():
+    dtype = '[{"__tuple__": true, "items": ["value", "<f8", [3]]}]'
+    result = _fetcher(dtype, [1], SUB_ARRAY_DATA).strict_fetch(slice(0, 4))
+    assert result.dtype == SUB_ARRAY_DATA.dtype
+    assert (result == SUB_ARRAY_DATA).all()
+
+
+@pytest.mark.parametrize("index", [2, numpy.int64(2), numpy.uint8(2)])
+def test_strict_fetch_integer_index(index):
+    result = _fetcher(SCALAR_DTYPE, [1], SCALAR_DATA).strict_fetch(index)
+    assert result.shape == (1,)
+    assert result[0] == SCALAR_DATA[2]
+
+
+@pytest.mark.parametrize("index", [True, numpy.bool_(False), 1.0, "1"])
+def test_strict_fetch_rejects_non_integer_index(index):
+    with pytest.raises(Exception, match="fetch supports only int or slice"):
+        _fetcher(SCALAR_DTYPE, [1], SCALAR_DATA).strict_fetch(index)